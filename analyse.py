@@ -0,0 +1,107 @@
+import importlib.util
+import io
+import threading
+import pandas as pd
+import streamlit as st
+import speicher
+
+# --- KONFIGURATION ---
+STUFEN = ["Grün", "Gelb", "ROT"]
+SPERREN = "SOFORT SPERREN"
+KATEGORIEN = ["Kunde", "Standort", "Bereich", "Typ", "Bauteil", "Mangel", "Massnahme"]
+PARQUET = bool(importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet"))
+
+# Archiv als spaltenweiser DataFrame, einmal pro Server-Prozess; wächst mit jedem abgeschlossenen Bericht
+_lock = threading.Lock()
+_df = None
+_ids = set()
+
+
+def _laden(ids):
+    df = pd.DataFrame.from_records(speicher.archiv_eintraege(ids), columns=speicher.ARCHIV_SPALTEN)
+    teile = df["Mangel"].fillna("").astype(str).str.extract(r"^([^:]*):?(.*)$")  # auch bei 0 Zeilen zwei Spalten
+    df["Mangel"], df["Kommentar"] = teile[0].str.strip(), teile[1].str.strip()
+    df["Datum"] = pd.to_datetime(df["Datum"], format="%d.%m.%Y", errors="coerce")
+    return df
+
+
+def frame():
+    # Nur Berichte nachladen, die seit dem letzten Aufruf abgeschlossen wurden
+    global _df
+    with _lock:
+        neu = set(speicher.archiv_ids()) - _ids
+        if neu or _df is None:
+            teil = _laden(sorted(neu))
+            df = teil if _df is None else pd.concat([_df, teil], ignore_index=True)
+            # Wenige verschiedene Werte pro Spalte -> Kategorien (kleiner, schnelleres groupby)
+            _df = df.astype({**{k: "category" for k in KATEGORIEN}, "Stufe": pd.CategoricalDtype(STUFEN)})
+            _ids.update(neu)
+        return _df
+
+
+# --- KENNZAHLEN ---
+def stufen_je(df, spalten):
+    # Anzahl Grün/Gelb/ROT je Gruppe, die meisten ROT zuerst
+    t = df.groupby(spalten + ["Stufe"], observed=True, dropna=False).size().unstack("Stufe", fill_value=0)
+    return t.reindex(columns=STUFEN, fill_value=0).sort_values(["ROT", "Gelb"], ascending=False)
+
+
+def haeufigste_maengel(df, n=10):
+    zahlen = df["Mangel"].value_counts()
+    return zahlen[zahlen > 0].head(n)
+
+
+def offene_sperren(df):
+    # Pro Kunde/Standort/Halle gilt nur die letzte Prüfung; ältere Sperren sind damit erledigt
+    letzte = df.groupby(["Kunde", "Standort", "Bereich"], observed=True, dropna=False)["bericht_id"].transform("max")
+    offen = df[(df["bericht_id"] == letzte) & (df["Massnahme"] == SPERREN)]
+    return offen[["Kunde", "Standort", "Bereich", "Datum", "Regal", "Bauteil", "Position", "Mangel", "Kommentar"]]
+
+
+def export(df, format="csv"):
+    # Ganzes Archiv in einem Schreibvorgang
+    buf = io.BytesIO()
+    if format == "parquet":
+        df.to_parquet(buf, index=False)
+    else:
+        df.to_csv(buf, index=False, sep=";", encoding="utf-8-sig")  # Excel öffnet das direkt
+    return buf.getvalue()
+
+
+# --- ANSICHT ---
+@st.fragment
+def anzeigen(kunde=None):
+    alles = frame()
+    df = alles
+    if kunde and not st.toggle("Alle Kunden", key="analyse_alle"):
+        df = df[df["Kunde"] == kunde]
+    if df.empty:
+        st.info("Noch keine abgeschlossenen Berichte.")
+        return
+
+    zahlen = df["Stufe"].value_counts()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Einträge", len(df))
+    c2.metric("🔴 ROT", int(zahlen["ROT"]))
+    c3.metric("🟡 Gelb", int(zahlen["Gelb"]))
+    c4.metric("🟢 Grün", int(zahlen["Grün"]))
+
+    gruppe = st.segmented_control("Aufteilen nach", ["Kunde", "Bereich", "Bauteil"], default="Bereich",
+                                  key="analyse_gruppe") or "Bereich"
+    st.dataframe(stufen_je(df, [gruppe]), use_container_width=True)
+
+    c_m, c_s = st.columns([1, 2])
+    c_m.write("**Häufigste Hauptmängel**")
+    c_m.dataframe(haeufigste_maengel(df), use_container_width=True)
+    sperren = offene_sperren(df)
+    c_s.write(f"**Offene Sperrungen ({len(sperren)})**")
+    c_s.dataframe(sperren, hide_index=True, use_container_width=True)
+
+    st.write("---")
+    c_csv, c_pq = st.columns(2)
+    # data als Funktion: die Datei wird erst beim Klick erzeugt, nicht bei jedem Rerun
+    c_csv.download_button(f"📤 Archiv als CSV ({len(alles)} Einträge)", lambda: export(alles, "csv"),
+                          "archiv.csv", "text/csv", use_container_width=True)
+    if PARQUET:
+        c_pq.download_button("📤 Archiv als Parquet", lambda: export(alles, "parquet"),
+                             "archiv.parquet", "application/octet-stream", use_container_width=True)
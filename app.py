@@ -1,17 +1,27 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
 from datetime import datetime
-from PIL import Image
+import bilder
+import bericht
+import eintrag
+import jobs
+import liste
+import massenimport
+import messung
+import speicher
 import io
-import os
+import uuid
 
 # Seite konfigurieren
 st.set_page_config(page_title="Regal-Check Profi", layout="wide")
+messung.skript_start()
 
 # Speicher initialisieren
+if 'sitzung' not in st.session_state:
+    st.session_state.sitzung = st.query_params.get("s") or uuid.uuid4().hex
+    st.query_params["s"] = st.session_state.sitzung
 if 'inspections' not in st.session_state:
-    st.session_state.inspections = []
+    st.session_state.inspections = speicher.entwurf_laden(st.session_state.sitzung)
 if 'edit_index' not in st.session_state:
     st.session_state.edit_index = None
 
@@ -25,145 +35,127 @@ with st.expander("📋 Kunden- & Standortdetails", expanded=True):
     gebaeude = c_head2.text_input("Halle / Bereich", placeholder="z.B. Halle 4 / Wareneingang", key="k_halle_input")
     inspektor = c_head2.text_input("Prüfer Name", placeholder="Dein Name", key="k_pruefer_input")
 
-# --- EINGABEMASKE ---
-st.divider()
-if st.session_state.edit_index is not None:
-    st.warning(f"🔄 Bearbeitung: Eintrag #{st.session_state.edit_index + 1}")
-    current_data = st.session_state.inspections[st.session_state.edit_index]
-else:
-    current_data = {"Regal": "", "Typ": "Palettenregal", "Bauteil": "Stütze", "Position": "", "Stufe": "Grün", "Mangel": "Stapleranprall", "Massnahme": "Beobachten", "Fotos": []}
-
-col1, col2, col3 = st.columns([1, 1, 1])
-
-with col1:
-    regal_nr = st.text_input("Regal-Nummer", value=current_data["Regal"], placeholder="z.B. R-001")
-    regal_typ = st.selectbox("Regalanlage", ["Palettenregal", "Fachbodenregal", "Kragarmregal", "Durchlaufregal", "Sonstiges"], index=0)
-    bauteil = st.selectbox("Bauteil", ["Stütze", "Traverse", "Rammschutz", "Aussteifung"], index=0)
-    
-    # Dynamische Platzhalter je nach Bauteil
-    if bauteil == "Stütze":
-        p_hold = "z.B. Pfosten vorne links"
-    elif bauteil == "Traverse":
-        p_hold = "z.B. Ebene 3, Feld 10"
-    else:
-        p_hold = "Genaue Lagebeschreibung"
-    pos = st.text_input("Position / Ebene / Feld", value=current_data["Position"], placeholder=p_hold)
-
-with col2:
-    st.write("**Gefahrenstufe:**")
-    gefahr = st.radio("Status", ["Grün", "Gelb", "ROT"], index=["Grün", "Gelb", "ROT"].index(current_data["Stufe"]), horizontal=True)
-    mangel = st.selectbox("Hauptmangel", ["Stapleranprall", "Sicherungsstift fehlt", "Bodenanker lose", "Überladung", "Verformung", "Sonstiges"])
-    kommentar = st.text_input("Zusatz-Kommentar (Vorschlag)", value=current_data.get("Mangel", "").split(": ")[-1] if ":" in current_data["Mangel"] else "", placeholder="z.B. Delle > 3mm")
-    massnahme = st.selectbox("Maßnahme", ["Beobachten", "Tausch binnen 4 Wo.", "SOFORT SPERREN", "Stift ersetzen", "Anker nachziehen"])
-
-with col3:
-    st.write("📸 **Fotodokumentation**")
-    f1 = st.camera_input("1. Detailaufnahme (Schaden)", key="cam_detail")
-    f2 = st.camera_input("2. Standortaufnahme (Übersicht)", key="cam_standort")
-    f3 = st.camera_input("3. Traglastschild / Sonstiges", key="cam_schild")
-
-# --- SPEICHERN ---
-if st.button("✅ Eintrag speichern", use_container_width=True):
-    if not regal_nr:
-        st.error("Bitte Regal-Nummer angeben!")
-    else:
-        # Fotos verarbeiten
-        new_photos = []
-        # Wenn wir bearbeiten, behalten wir alte Fotos bei, außer neue werden gemacht
-        if st.session_state.edit_index is not None:
-            new_photos = current_data.get("Fotos", [])
-            
-        for f in [f1, f2, f3]:
-            if f:
-                img = Image.open(f).convert("RGB")
-                path = f"img_{datetime.now().timestamp()}.jpg"
-                img.save(path)
-                new_photos.append(path)
-        
-        entry = {
-            "Regal": regal_nr, "Typ": regal_typ, "Bauteil": bauteil, "Position": pos,
-            "Stufe": gefahr, "Mangel": f"{mangel}: {kommentar}", "Massnahme": massnahme, "Fotos": new_photos
-        }
-        
-        if st.session_state.edit_index is not None:
-            st.session_state.inspections[st.session_state.edit_index] = entry
-            st.session_state.edit_index = None
+# --- AUFZÄHLUNG IN DER APP (eigenes Fragment: Blättern/Löschen lädt nur die Liste neu) ---
+@st.fragment
+def mangelliste(kopf):
+    if st.session_state.inspections:
+        st.divider()
+        st.subheader("📋 Aktuelle Mängelliste")
+        sichtbar, tabellen_modus = liste.ansicht(st.session_state.inspections, eintrag.BAUTEILE.optionen, key="liste")
+        if tabellen_modus:
+            geaendert = liste.tabelle(st.session_state.inspections, sichtbar, {
+                "Bauteil": eintrag.BAUTEILE.optionen, "Stufe": eintrag.STUFEN.optionen,
+                "Massnahme": eintrag.MASSNAHMEN.optionen}, key="liste")
+            for i in geaendert:
+                speicher.eintrag_speichern(st.session_state.sitzung, st.session_state.inspections[i], ans_ende=False)
+                bericht.vorbereiten(st.session_state.inspections[i])
+            if geaendert:
+                liste.neu_laden()
         else:
-            st.session_state.inspections.append(entry)
-        st.rerun()
+            for idx in sichtbar:
+                item = st.session_state.inspections[idx]
+                c_i, c_e, c_d = st.columns([7, 2, 1])
+                icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
+                c_i.write(f"{icon} **#{idx+1} Regal {item['Regal']}** | {item['Bauteil']} ({item['Position']})" + (" ⏳" if bilder.ausstehend(item['Fotos']) else ""))
+                if c_e.button("✏️", key=f"edit_{idx}"):
+                    st.session_state.edit_index = idx
+                    st.rerun()  # Formular muss neu befüllt werden
+                if c_d.button("🗑️", key=f"del_{idx}"):
+                    speicher.eintrag_loeschen(st.session_state.inspections.pop(idx))
+                    liste.neu_laden()
+
+        # --- PDF GENERIERUNG ---
+        klein = st.toggle("📉 Kleine Datei (Fotos komprimiert, für den Download unterwegs)",
+                          value=bericht.MODUS == "optimiert", key="pdf_klein")
+        if st.button("📄 PDF-Bericht erstellen", type="primary", use_container_width=True):
+            kopf = dict(kopf, Datum=datetime.now().strftime('%d.%m.%Y'))
+            st.session_state.pdf_job = jobs.starten(f"Bericht {kopf['Kunde']}", bericht.bericht_laden, kopf, list(st.session_state.inspections),
+                                                    "optimiert" if klein else "standard")
+        jobs.anzeigen(st.session_state.get("pdf_job"), "📥 PDF Herunterladen", f"Bericht_{kopf['Kunde']}.pdf", key="dl_bericht")
 
-# --- AUFZÄHLUNG IN DER APP ---
-if st.session_state.inspections:
+
+# --- EINGABEMASKE (Fragment: Speichern lädt nur Formular + Liste neu, nicht die ganze Seite) ---
+@st.fragment
+@messung.gemessen("eingabe")
+def eingabe(kopf):
     st.divider()
-    st.subheader("📋 Aktuelle Mängelliste")
-    for idx, item in enumerate(st.session_state.inspections):
-        c_i, c_e, c_d = st.columns([7, 2, 1])
-        icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
-        c_i.write(f"{icon} **#{idx+1} Regal {item['Regal']}** | {item['Bauteil']} ({item['Position']})")
-        if c_e.button("✏️", key=f"edit_{idx}"):
-            st.session_state.edit_index = idx
-            st.rerun()
-        if c_d.button("🗑️", key=f"del_{idx}"):
-            st.session_state.inspections.pop(idx)
-            st.rerun()
-
-    # --- PDF GENERIERUNG ---
-    if st.button("📄 PDF-Bericht erstellen", type="primary", use_container_width=True):
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=20)
-        
-        # Deckblatt
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 24)
-        pdf.cell(0, 40, "Inspektionsbericht Regalanlagen", ln=True, align='C')
-        pdf.set_font("Arial", '', 14)
-        pdf.cell(0, 10, f"Kunde: {kunde}", ln=True)
-        pdf.cell(0, 10, f"Standort: {standort} | Bereich: {gebaeude}", ln=True)
-        pdf.cell(0, 10, f"Prüfer: {inspektor} | Datum: {datetime.now().strftime('%d.%m.%Y')}", ln=True)
-        pdf.ln(10)
-        
-        # Mängel-Details
-        for item in st.session_state.inspections:
-            if pdf.get_y() > 160: # Platz-Check für Block + Bilder
-                pdf.add_page()
-
-            # Balken-Farbe
-            if item['Stufe'] == "ROT": pdf.set_fill_color(255, 200, 200)
-            elif item['Stufe'] == "Gelb": pdf.set_fill_color(255, 243, 200)
-            else: pdf.set_fill_color(200, 255, 200)
-            
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(0, 12, f"REGAL: {item['Regal']} - STATUS: {item['Stufe']}", ln=True, fill=True)
-            
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(45, 8, "Bauteil:", ln=0)
-            pdf.set_font("Arial", '', 12)
-            pdf.cell(0, 8, f"{item['Bauteil']}", ln=True)
-            
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(45, 8, "Position / Ebene:", ln=0)
-            pdf.set_font("Arial", '', 12)
-            pdf.cell(0, 8, f"{item['Position']}", ln=True)
-            
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(0, 8, "Schadensbeschreibung:", ln=True)
-            pdf.set_font("Arial", '', 11)
-            pdf.multi_cell(0, 7, f"{item['Mangel']}\nMassnahme: {item['Massnahme']}")
-            
-            # Bilder auf einer Ebene nebeneinander
-            if item['Fotos']:
-                pdf.ln(3)
-                y_imgs = pdf.get_y()
-                x_imgs = 10
-                for p in item['Fotos'][:3]: # Max 3 Bilder
-                    if os.path.exists(p):
-                        pdf.image(p, x=x_imgs, y=y_imgs, w=45)
-                        x_imgs += 50
-                pdf.set_y(y_imgs + 42)
-            
-            pdf.ln(5)
-            pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-            pdf.ln(10)
-
-        pdf_bytes = pdf.output(dest='S').encode('latin-1', 'replace')
-        st.download_button("📥 PDF Herunterladen", data=pdf_bytes, file_name=f"Bericht_{kunde}.pdf")
\ No newline at end of file
+    if st.session_state.edit_index is not None:
+        st.warning(f"🔄 Bearbeitung: Eintrag #{st.session_state.edit_index + 1}")
+        current_data = st.session_state.inspections[st.session_state.edit_index]
+    else:
+        current_data = eintrag.Eintrag()
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    with col1:
+        regal_nr = st.text_input("Regal-Nummer", value=current_data.regal, placeholder="z.B. R-001")
+        regal_typ = st.selectbox("Regalanlage", eintrag.TYPEN.optionen, index=eintrag.TYPEN.index(current_data.typ))
+        bauteil = st.selectbox("Bauteil", eintrag.BAUTEILE.optionen, index=eintrag.BAUTEILE.index(current_data.bauteil))
+
+        # Dynamische Platzhalter je nach Bauteil
+        if bauteil == "Stütze":
+            p_hold = "z.B. Pfosten vorne links"
+        elif bauteil == "Traverse":
+            p_hold = "z.B. Ebene 3, Feld 10"
+        else:
+            p_hold = "Genaue Lagebeschreibung"
+        pos = st.text_input("Position / Ebene / Feld", value=current_data.position, placeholder=p_hold)
+
+    with col2:
+        st.write("**Gefahrenstufe:**")
+        gefahr = st.radio("Status", eintrag.STUFEN.optionen, index=eintrag.STUFEN.index(current_data.stufe), horizontal=True)
+        mangel = st.selectbox("Hauptmangel", eintrag.MAENGEL.optionen, index=eintrag.MAENGEL.index(current_data.mangel))
+        kommentar = st.text_input("Zusatz-Kommentar (Vorschlag)", value=current_data.kommentar, placeholder="z.B. Delle > 3mm")
+        massnahme = st.selectbox("Maßnahme", eintrag.MASSNAHMEN.optionen, index=eintrag.MASSNAHMEN.index(current_data.massnahme))
+
+    with col3:
+        st.write("📸 **Fotodokumentation**")
+        f1 = st.camera_input("1. Detailaufnahme (Schaden)", key="cam_detail")
+        f2 = st.camera_input("2. Standortaufnahme (Übersicht)", key="cam_standort")
+        f3 = st.camera_input("3. Traglastschild / Sonstiges", key="cam_schild")
+
+    # --- SPEICHERN ---
+    if st.button("✅ Eintrag speichern", use_container_width=True):
+        if not regal_nr:
+            st.error("Bitte Regal-Nummer angeben!")
+        else:
+            # Fotos verarbeiten
+            new_photos = []
+            # Wenn wir bearbeiten, behalten wir alte Fotos bei, außer neue werden gemacht
+            if st.session_state.edit_index is not None:
+                new_photos = list(current_data.fotos)
+
+            for f in [f1, f2, f3]:
+                if f:
+                    new_photos.append(bilder.ingest_async(f))
+
+            entry = eintrag.Eintrag(regal_nr, regal_typ, bauteil, pos, gefahr, mangel, kommentar, massnahme, new_photos)
+
+            if st.session_state.edit_index is not None:
+                entry.id = current_data.id
+                speicher.eintrag_speichern(st.session_state.sitzung, entry, ans_ende=False)
+                st.session_state.inspections[st.session_state.edit_index] = entry
+                st.session_state.edit_index = None
+            else:
+                speicher.eintrag_speichern(st.session_state.sitzung, entry)
+                st.session_state.inspections.append(entry)
+            bericht.vorbereiten(entry)
+            liste.neu_laden()
+
+    # --- MASSENIMPORT ---
+    neu = massenimport.anzeigen({"Bauteil": eintrag.BAUTEILE.optionen, "Stufe": eintrag.STUFEN.optionen,
+                                 "Mangel": eintrag.MAENGEL.optionen, "Massnahme": eintrag.MASSNAHMEN.optionen})
+    if neu is not None:
+        items = massenimport.eintraege(neu)
+        speicher.eintraege_speichern(st.session_state.sitzung, items)
+        for e in items:
+            bericht.vorbereiten(e)
+        st.session_state.inspections.extend(items)
+        liste.neu_laden()
+
+    mangelliste(kopf)
+
+
+eingabe({"Kunde": kunde, "Standort": standort, "Bereich": gebaeude, "Pruefer": inspektor})
+messung.panel(st.session_state.sitzung)
+messung.skript_ende()
\ No newline at end of file
@@ -1,12 +1,23 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
 from datetime import datetime
-from PIL import Image
-import os
+import analyse
+import bilder
+import bericht
+import eintrag
+import jobs
+import journal
+import kunden
+import liste
+import massenimport
+import messung
+import speicher
+import archivsuche
+import uuid
 
 # --- KONFIGURATION ---
 st.set_page_config(page_title="Regal-Check Profi", layout="wide")
+messung.skript_start()
 
 # Google Sheets Anbindung (Nur zum LESEN der Kundenliste)
 def get_conn():
@@ -16,17 +27,19 @@ def get_conn():
     except:
         return None
 
-conn = get_conn()
+with messung.span("sheets_verbinden"):
+    conn = get_conn()
 
-# Session State initialisieren
+# Sitzung über die URL wiedererkennen (überlebt Browser-Refresh und Server-Neustart)
+if 'sitzung' not in st.session_state:
+    st.session_state.sitzung = st.query_params.get("s") or uuid.uuid4().hex
+    st.query_params["s"] = st.session_state.sitzung
+
+# Session State initialisieren (laufende Inspektion kommt aus der Datenbank, siehe gemeinsamer_entwurf)
 if 'inspections' not in st.session_state:
     st.session_state.inspections = []
-if 'report_archive' not in st.session_state:
-    st.session_state.report_archive = []
 if 'form_iteration' not in st.session_state:
     st.session_state.form_iteration = 0
-if 'temp_customers' not in st.session_state:
-    st.session_state.temp_customers = []
 if 'edit_data' not in st.session_state:
     st.session_state.edit_data = None
 
@@ -36,29 +49,218 @@ def reset_form():
 
 # --- SIDEBAR ---
 st.sidebar.title("🏢 Verwaltung")
-cloud_customers = []
-if conn:
-    try:
-        df_c = conn.read(worksheet="Kunden", ttl="1m")
-        cloud_customers = df_c["Kunde"].tolist()
-    except:
-        pass
-
-all_customers = sorted(list(set(cloud_customers + st.session_state.temp_customers)))
-selected_customer = st.sidebar.selectbox("Kunde wählen", ["---"] + all_customers)
+# Kundenliste aus dem lokalen Index (wird im Hintergrund mit dem Sheet abgeglichen)
+kunden_index = kunden.index(conn)
+suche = st.sidebar.text_input("🔎 Kunde suchen", placeholder="Name oder Anfang")
+treffer = kunden_index.suchen(suche)
+if st.session_state.get("kunde_wahl", "---") not in treffer + ["---"]:
+    treffer = [st.session_state.kunde_wahl] + treffer
+selected_customer = st.sidebar.selectbox("Kunde wählen", ["---"] + treffer, key="kunde_wahl")
+if kunden_index.fehler:
+    st.sidebar.caption("⚠️ Kundenliste offline - letzter Stand wird verwendet")
+# Ergebnisse gehen erst ins lokale Journal, der Upload ins Sheet läuft im Hintergrund
+sync = journal.sync(conn)
+if sync and sync.offen():
+    st.sidebar.caption(f"☁️ {sync.offen()} Änderungen noch nicht hochgeladen" + (" (offline)" if sync.fehler else ""))
 
 new_cust = st.sidebar.text_input("➕ Neuen Kunden anlegen", placeholder="z.B. Muster AG")
-if st.sidebar.button("Kunde für Sitzung merken"):
-    if new_cust and new_cust not in all_customers:
-        st.session_state.temp_customers.append(new_cust)
+if st.sidebar.button("Kunde speichern"):
+    if new_cust and new_cust not in kunden_index.alle():
+        kunden_index.hinzufuegen(new_cust)
         st.rerun()
 
+# Auswahllisten (Code-Tabellen, siehe eintrag.py)
+b_list, s_list = eintrag.BAUTEILE.optionen, eintrag.STUFEN.optionen
+m_list, ms_list = eintrag.MAENGEL.optionen, eintrag.MASSNAHMEN.optionen
+
+def gemeinsamer_entwurf(kunde):
+    # Alle Prüfer eines Kunden schreiben in denselben Entwurf; neu laden, sobald irgendwer etwas geändert hat
+    entwurf = f"kunde:{kunde}"
+    stand = speicher.entwurf_stand(entwurf)
+    if st.session_state.get("entwurf_stand") != (entwurf, stand):
+        offen = {e["_id"]: e["Fotos"] for e in st.session_state.inspections if "_id" in e and bilder.ausstehend(e["Fotos"])}
+        in_arbeit = (st.session_state.edit_data or {}).get("_id")
+        st.session_state.inspections = [e for e in speicher.entwurf_laden(entwurf) if e.id != in_arbeit]
+        for e in st.session_state.inspections:
+            e.fotos = offen.get(e.id, e.fotos)
+        st.session_state.entwurf_stand = (entwurf, stand)
+    return entwurf
+
+
+# --- FRAGMENTE (Speichern, Blättern usw. laden nur ihren Teil neu, nicht Sidebar/Kundenliste) ---
+@st.fragment
+def aktuelle_liste(selected_customer, kopf):
+    entwurf = gemeinsamer_entwurf(selected_customer)
+    # --- UNTEN: LISTE & RÜCKGÄNGIG ---
+    if st.session_state.inspections:
+        st.divider()
+        eigene = [i for i, e in enumerate(st.session_state.inspections) if e.get("_von") == st.session_state.sitzung]
+        if eigene and st.button("↩️ Letzten Eintrag sofort löschen (Undo)", use_container_width=True,
+                                help="Nur eigene Einträge"):
+            speicher.eintrag_loeschen(st.session_state.inspections.pop(eigene[-1]))
+            liste.neu_laden()
+
+        st.subheader("📋 Aktuelle Liste")
+        sichtbar, tabellen_modus = liste.ansicht(st.session_state.inspections, b_list, key="liste")
+        if tabellen_modus:
+            geaendert = liste.tabelle(st.session_state.inspections, sichtbar,
+                                      {"Bauteil": b_list, "Stufe": s_list, "Massnahme": ms_list}, key="liste")
+            for i in geaendert:
+                speicher.eintrag_speichern(entwurf, st.session_state.inspections[i], ans_ende=False)
+                bericht.vorbereiten(st.session_state.inspections[i], "archiv")
+            if geaendert:
+                liste.neu_laden()
+        else:
+            # Knöpfe hängen an der Eintrags-ID: lädt die Liste vorher neu (anderer Prüfer), trifft der Klick
+            # trotzdem den gemeinten Eintrag -- oder gar keinen, wenn der schon weg ist
+            for idx in sichtbar:
+                item = st.session_state.inspections[idx]
+                c_t, c_e, c_d = st.columns([8, 1, 1])
+                icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
+                c_t.write(f"{icon} **Regal {item['Regal']}** - {item['Bauteil']} ({item['Position']})" + (" ⏳" if bilder.ausstehend(item['Fotos']) else ""))
+
+                if c_e.button("✏️", key=f"ed_{item.id}"):
+                    st.session_state.edit_data = st.session_state.inspections.pop(idx)
+                    st.session_state.form_iteration += 1  # neue Widget-Keys, sonst bleiben die alten Werte stehen
+                    st.rerun()  # Formular muss neu befüllt werden
+                if c_d.button("🗑️", key=f"del_{item.id}"):
+                    speicher.eintrag_loeschen(st.session_state.inspections.pop(idx))
+                    liste.neu_laden()
+
+        st.write("---")
+        if st.button("💾 BERICHT ABSCHLIESSEN", type="primary", use_container_width=True):
+            speicher.bericht_abschliessen(entwurf, selected_customer,
+                                          kopf["Datum"], kopf["Standort"], kopf["Bereich"])
+            st.session_state.inspections = []
+            if sync:
+                sync.anstossen()
+            st.success("Archiviert!")
+            st.rerun()  # Archiv-Tab liegt außerhalb des Fragments
+
+
+@st.fragment
+@messung.gemessen("eingabe")
+def eingabe(selected_customer, kopf):
+    entwurf = gemeinsamer_entwurf(selected_customer)
+    st.divider()
+
+    # Logik für Bearbeitung vs. Placeholder
+    edit = st.session_state.edit_data
+    it = st.session_state.form_iteration
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    with col1:
+        # Regal-Nr
+        regal_nr = st.text_input("Regal-Nr.", 
+                                value=edit["Regal"] if edit else "", 
+                                placeholder="z.B. R-01 / Feld 10", 
+                                key=f"r_{it}")
+
+        # Bauteil
+        b_idx = eintrag.BAUTEILE.index(edit.bauteil) if edit else 0
+        bauteil = st.selectbox("Bauteil", b_list, index=b_idx, key=f"b_{it}")
+
+        # Position
+        pos = st.text_input("Position / Ebene", 
+                           value=edit["Position"] if edit else "", 
+                           placeholder="z.B. Ebene 3 / Pfosten vorn", 
+                           key=f"p_{it}")
+
+    with col2:
+        # Gefahrenstufe
+        s_idx = eintrag.STUFEN.index(edit.stufe) if edit else 0
+        gefahr = st.radio("Status", s_list, index=s_idx, horizontal=True, key=f"s_{it}")
+
+        # Mangel
+        m_idx = eintrag.MAENGEL.index(edit.mangel) if edit else 0
+        mangel_sel = st.selectbox("Hauptmangel", m_list, index=m_idx, key=f"m_{it}")
+
+        # Zusatz-Kommentar
+        k_val = edit.kommentar if edit else ""
+        komm = st.text_input("Zusatz-Info", 
+                            value=k_val, 
+                            placeholder="z.B. Delle > 3mm / Verformung", 
+                            key=f"k_{it}")
+
+        # Maßnahme
+        ms_idx = eintrag.MASSNAHMEN.index(edit.massnahme) if edit else 0
+        massn = st.selectbox("Maßnahme", ms_list, index=ms_idx, key=f"ms_{it}")
+
+    with col3:
+        st.write("📸 **Fotos**")
+        f1 = st.camera_input("1. Detail (Schaden)", key=f"f1_{it}")
+        f2 = st.camera_input("2. Übersicht", key=f"f2_{it}")
+        f3 = st.camera_input("3. Typenschild", key=f"f3_{it}")
+
+    if st.button("✅ Regal zur Liste hinzufügen", use_container_width=True):
+        if not regal_nr: st.error("Regal-Nr. fehlt!")
+        else:
+            fotos = edit["Fotos"] if edit else []
+            new_f = [f for f in [f1, f2, f3] if f]
+            if new_f:
+                fotos = []
+                for f in new_f:
+                    fotos.append(bilder.ingest_async(f))
+
+            entry = eintrag.Eintrag(regal_nr, None, bauteil, pos, gefahr, mangel_sel, komm, massn, fotos,
+                                    id=edit.id if edit else None, von=edit.von if edit else st.session_state.sitzung)
+            speicher.eintrag_speichern(entwurf, entry)
+            st.session_state.inspections.append(entry)
+            bericht.vorbereiten(entry, "archiv")
+            reset_form()
+            liste.neu_laden()
+
+    # Massenimport (z.B. Regalliste aus dem Lagerverwaltungssystem des Kunden)
+    neu = massenimport.anzeigen({"Bauteil": b_list, "Stufe": s_list, "Mangel": m_list, "Massnahme": ms_list})
+    if neu is not None:
+        items = massenimport.eintraege(neu)
+        for e in items:
+            e.von = st.session_state.sitzung
+        speicher.eintraege_speichern(entwurf, items)
+        for e in items:
+            bericht.vorbereiten(e, "archiv")
+        st.session_state.inspections.extend(items)
+        liste.neu_laden()
+
+    aktuelle_liste(selected_customer, kopf)
+
+
+@st.fragment
+def archiv(selected_customer):
+    # Archiv (Ohne Inhaltsverzeichnis) - nur Kopfdaten, Details erst beim PDF laden
+    st.subheader("📁 Archiv")
+    klein = st.toggle("📉 Kleine Datei (Fotos komprimiert, für den Download unterwegs)",
+                      value=bericht.MODUS == "optimiert", key="archiv_klein")
+    for rep in speicher.berichte(selected_customer):
+        idx = rep["id"]
+        with st.expander(f"Bericht vom {rep['Datum']} - {rep.get('Bereich','')}"):
+            if st.button(f"📥 PDF Bericht laden", key=f"pdf_{idx}"):
+                st.session_state[f"pdf_job_{idx}"] = jobs.starten(f"Bericht {rep['Datum']}", bericht.archiv_laden, speicher.bericht(idx),
+                                                                 "optimiert" if klein else "standard")
+            jobs.anzeigen(st.session_state.get(f"pdf_job_{idx}"), "Speichern", "Bericht.pdf", key=f"dl_{idx}")
+
+    # Sammel-Export: mehrere Berichte auf einmal als ZIP (parallel gerendert, fertige PDFs werden nur eingepackt)
+    with st.expander("📦 Mehrere Berichte als ZIP"):
+        alle = st.toggle("Alle Kunden", key="export_alle")
+        if alle:
+            ids = speicher.archiv_ids()
+            st.caption(f"{len(ids)} abgeschlossene Berichte")
+        else:
+            auswahl = {f"{r['Datum']} - {r.get('Bereich') or ''} (#{r['id']})": r["id"] for r in speicher.berichte(selected_customer)}
+            ids = [auswahl[n] for n in st.multiselect("Berichte", list(auswahl), default=list(auswahl), key="export_auswahl")]
+        if st.button("📦 ZIP erstellen", disabled=not ids, key="export_start"):
+            st.session_state.export_job = jobs.starten(f"Export {len(ids)} Berichte", bericht.stapel_laden, ids,
+                                                       "optimiert" if klein else "standard", einheit="Berichte")
+        jobs.anzeigen(st.session_state.get("export_job"), "📥 ZIP herunterladen",
+                      f"Berichte_{'Alle' if alle else selected_customer}.zip", key="dl_export")
+
+
 # --- HAUPTSEITE ---
 if selected_customer == "---":
     st.title("🛡️ Regal-Check System")
     st.info("Bitte wählen Sie einen Kunden aus.")
 else:
-    tab1, tab2 = st.tabs(["📝 Neue Inspektion", "📁 Archiv (Sitzung)"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📝 Neue Inspektion", "📁 Archiv", "📊 Auswertung", "🔎 Suche"])
 
     with tab1:
         st.subheader(f"Prüfung für: {selected_customer}")
@@ -69,142 +271,17 @@ else:
             inspektor = c2.text_input("Prüfer Name", placeholder="Dein Name")
             datum_heute = c2.date_input("Prüfdatum", datetime.now())
 
-        st.divider()
-        
-        # Logik für Bearbeitung vs. Placeholder
-        edit = st.session_state.edit_data
-        it = st.session_state.form_iteration
-        col1, col2, col3 = st.columns([1, 1, 1])
-
-        with col1:
-            # Regal-Nr
-            regal_nr = st.text_input("Regal-Nr.", 
-                                    value=edit["Regal"] if edit else "", 
-                                    placeholder="z.B. R-01 / Feld 10", 
-                                    key=f"r_{it}")
-            
-            # Bauteil
-            b_list = ["Stütze", "Traverse", "Rammschutz", "Aussteifung"]
-            b_idx = b_list.index(edit["Bauteil"]) if edit else 0
-            bauteil = st.selectbox("Bauteil", b_list, index=b_idx, key=f"b_{it}")
-            
-            # Position
-            pos = st.text_input("Position / Ebene", 
-                               value=edit["Position"] if edit else "", 
-                               placeholder="z.B. Ebene 3 / Pfosten vorn", 
-                               key=f"p_{it}")
-
-        with col2:
-            # Gefahrenstufe
-            s_list = ["Grün", "Gelb", "ROT"]
-            s_idx = s_list.index(edit["Stufe"]) if edit else 0
-            gefahr = st.radio("Status", s_list, index=s_idx, horizontal=True, key=f"s_{it}")
-            
-            # Mangel
-            m_list = ["Stapleranprall", "Sicherungsstift fehlt", "Bodenanker lose", "Überladung", "Sonstiges"]
-            m_main = edit["Mangel"].split(":")[0] if edit else "Stapleranprall"
-            m_idx = m_list.index(m_main) if m_main in m_list else 0
-            mangel_sel = st.selectbox("Hauptmangel", m_list, index=m_idx, key=f"m_{it}")
-            
-            # Zusatz-Kommentar
-            k_val = edit["Mangel"].split(":")[1].strip() if edit and ":" in edit["Mangel"] else ""
-            komm = st.text_input("Zusatz-Info", 
-                                value=k_val, 
-                                placeholder="z.B. Delle > 3mm / Verformung", 
-                                key=f"k_{it}")
-            
-            # Maßnahme
-            ms_list = ["Beobachten", "Tausch binnen 4 Wo.", "SOFORT SPERREN", "Stift ersetzen", "Anker nachziehen"]
-            ms_idx = ms_list.index(edit["Massn"]) if edit else 0
-            massn = st.selectbox("Maßnahme", ms_list, index=ms_idx, key=f"ms_{it}")
-
-        with col3:
-            st.write("📸 **Fotos**")
-            f1 = st.camera_input("1. Detail (Schaden)", key=f"f1_{it}")
-            f2 = st.camera_input("2. Übersicht", key=f"f2_{it}")
-            f3 = st.camera_input("3. Typenschild", key=f"f3_{it}")
-
-        if st.button("✅ Regal zur Liste hinzufügen", use_container_width=True):
-            if not regal_nr: st.error("Regal-Nr. fehlt!")
-            else:
-                fotos = edit["Fotos"] if edit else []
-                new_f = [f for f in [f1, f2, f3] if f]
-                if new_f:
-                    fotos = []
-                    for f in new_f:
-                        img = Image.open(f).convert("RGB")
-                        p = f"temp_{datetime.now().timestamp()}.jpg"
-                        img.save(p)
-                        fotos.append(p)
-                
-                st.session_state.inspections.append({
-                    "Regal": regal_nr, "Bauteil": bauteil, "Position": pos,
-                    "Stufe": gefahr, "Mangel": f"{mangel_sel}: {komm}", "Massn": massn, "Fotos": fotos
-                })
-                reset_form()
-                st.rerun()
-
-        # --- UNTEN: LISTE & RÜCKGÄNGIG ---
-        if st.session_state.inspections:
-            st.divider()
-            if st.button("↩️ Letzten Eintrag sofort löschen (Undo)", use_container_width=True):
-                st.session_state.inspections.pop()
-                st.rerun()
-
-            st.subheader("📋 Aktuelle Liste")
-            for idx, item in enumerate(st.session_state.inspections):
-                c_t, c_e, c_d = st.columns([8, 1, 1])
-                icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
-                c_t.write(f"{icon} **Regal {item['Regal']}** - {item['Bauteil']} ({item['Position']})")
-                
-                if c_e.button("✏️", key=f"ed_{idx}"):
-                    st.session_state.edit_data = st.session_state.inspections.pop(idx)
-                    st.rerun()
-                if c_d.button("🗑️", key=f"del_{idx}"):
-                    st.session_state.inspections.pop(idx)
-                    st.rerun()
-
-            st.write("---")
-            if st.button("💾 BERICHT ABSCHLIESSEN", type="primary", use_container_width=True):
-                st.session_state.report_archive.append({
-                    "Datum": datum_heute.strftime("%d.%m.%Y"),
-                    "Kunde": selected_customer, "Details": st.session_state.inspections.copy(),
-                    "Standort": standort, "Bereich": gebaeude
-                })
-                st.session_state.inspections = []
-                st.success("Archiviert!")
-                st.rerun()
+        eingabe(selected_customer, {"Standort": standort, "Bereich": gebaeude, "Pruefer": inspektor,
+                                    "Datum": datum_heute.strftime("%d.%m.%Y")})
 
     with tab2:
-        # Archiv (Ohne Inhaltsverzeichnis)
-        st.subheader("📁 Sitzungs-Archiv")
-        for idx, rep in enumerate(reversed(st.session_state.report_archive)):
-            if rep["Kunde"] == selected_customer:
-                with st.expander(f"Bericht vom {rep['Datum']} - {rep.get('Bereich','')}"):
-                    if st.button(f"📥 PDF Bericht laden", key=f"pdf_{idx}"):
-                        pdf = FPDF()
-                        pdf.set_auto_page_break(auto=True, margin=20)
-                        pdf.add_page()
-                        pdf.set_font("Arial", 'B', 20)
-                        pdf.cell(0, 30, f"Bericht: {rep['Kunde']}", ln=True, align='C')
-                        pdf.set_font("Arial", '', 12)
-                        pdf.cell(0, 10, f"Datum: {rep['Datum']} | Standort: {rep.get('Standort','')}", ln=True)
-                        pdf.ln(10)
-                        for item in rep["Details"]:
-                            if pdf.get_y() > 200: pdf.add_page()
-                            if item['Stufe'] == "ROT": pdf.set_fill_color(255, 200, 200)
-                            elif item['Stufe'] == "Gelb": pdf.set_fill_color(255, 243, 200)
-                            else: pdf.set_fill_color(200, 255, 200)
-                            pdf.set_font("Arial", 'B', 14)
-                            pdf.cell(0, 10, f"Regal {item['Regal']} - {item['Stufe']}", ln=True, fill=True)
-                            pdf.set_font("Arial", '', 11)
-                            pdf.multi_cell(0, 6, f"{item['Bauteil']} ({item['Position']})\n{item['Mangel']}\nMassnahme: {item['Massn']}")
-                            if item['Fotos']:
-                                pdf.ln(2); y, x = pdf.get_y(), 10
-                                for f in item['Fotos']:
-                                    if os.path.exists(f):
-                                        pdf.image(f, x=x, y=y, w=45); x += 50
-                                pdf.set_y(y + 42)
-                            pdf.ln(5); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
-                        pdf_bytes = pdf.output(dest='S').encode('latin-1', 'replace')
-                        st.download_button("Speichern", pdf_bytes, f"Bericht.pdf", key=f"dl_{idx}")
\ No newline at end of file
+        archiv(selected_customer)
+
+    with tab3:
+        analyse.anzeigen(selected_customer)
+
+    with tab4:
+        archivsuche.anzeigen(selected_customer)
+
+messung.panel(st.session_state.sitzung)
+messung.skript_ende()
\ No newline at end of file
@@ -1,17 +1,27 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
 from datetime import datetime
-from PIL import Image
+import bilder
+import bericht
+import eintrag
+import jobs
+import liste
+import massenimport
+import messung
+import speicher
 import io
-import os
+import uuid
 
 # Seite konfigurieren
 st.set_page_config(page_title="Regal-Check Profi", layout="wide")
+messung.skript_start()
 
 # Speicher initialisieren
+if 'sitzung' not in st.session_state:
+    st.session_state.sitzung = st.query_params.get("s") or uuid.uuid4().hex
+    st.query_params["s"] = st.session_state.sitzung
 if 'inspections' not in st.session_state:
-    st.session_state.inspections = []
+    st.session_state.inspections = speicher.entwurf_laden(st.session_state.sitzung)
 if 'edit_index' not in st.session_state:
     st.session_state.edit_index = None
 
@@ -33,129 +43,133 @@ with st.expander("📋 Kunden- & Standortdetails", expanded=True):
     gebaeude = c_head2.text_input("Halle / Bereich", placeholder="z.B. Halle 4 / Wareneingang")
     inspektor = c_head2.text_input("Prüfer Name", placeholder="Dein Name")
 
-# --- EINGABEMASKE ---
-st.divider()
-if st.session_state.edit_index is not None:
-    st.warning(f"🔄 Bearbeitung: Eintrag #{st.session_state.edit_index + 1}")
-    current_data = st.session_state.inspections[st.session_state.edit_index]
-else:
-    # Standardwerte für ein leeres Formular
-    current_data = {"Regal": "", "Typ": "Palettenregal", "Bauteil": "Stütze", "Position": "", "Stufe": "Grün", "Mangel": "Stapleranprall", "Massnahme": "Beobachten", "Fotos": []}
-
-# Nutze den iteration_key um Felder nach dem Speichern zu leeren
-iter_key = st.session_state.form_iteration
-
-col1, col2, col3 = st.columns([1, 1, 1])
-
-with col1:
-    regal_nr = st.text_input("Regal-Nummer", value=current_data["Regal"], placeholder="z.B. R-001", key=f"regal_{iter_key}")
-    regal_typ = st.selectbox("Regalanlage", ["Palettenregal", "Fachbodenregal", "Kragarmregal", "Durchlaufregal", "Sonstiges"], 
-                             index=["Palettenregal", "Fachbodenregal", "Kragarmregal", "Durchlaufregal", "Sonstiges"].index(current_data["Typ"]), 
-                             key=f"typ_{iter_key}")
-    bauteil = st.selectbox("Bauteil", ["Stütze", "Traverse", "Rammschutz", "Aussteifung"], 
-                           index=["Stütze", "Traverse", "Rammschutz", "Aussteifung"].index(current_data["Bauteil"]),
-                           key=f"bt_{iter_key}")
-    
-    # Dynamische Platzhalter
-    p_hold = "z.B. Pfosten vorne links" if bauteil == "Stütze" else "z.B. Ebene 3, Feld 10" if bauteil == "Traverse" else "Genaue Lage"
-    pos = st.text_input("Position / Ebene / Feld", value=current_data["Position"], placeholder=p_hold, key=f"pos_{iter_key}")
-
-with col2:
-    st.write("**Gefahrenstufe:**")
-    gefahr = st.radio("Status", ["Grün", "Gelb", "ROT"], 
-                      index=["Grün", "Gelb", "ROT"].index(current_data["Stufe"]), 
-                      horizontal=True, key=f"stufe_{iter_key}")
-    mangel = st.selectbox("Hauptmangel", ["Stapleranprall", "Sicherungsstift fehlt", "Bodenanker lose", "Überladung", "Verformung", "Sonstiges"], key=f"mangel_{iter_key}")
-    kommentar = st.text_input("Zusatz-Kommentar (Vorschlag)", placeholder="z.B. Delle > 3mm", key=f"kommentar_{iter_key}")
-    massnahme = st.selectbox("Maßnahme", ["Beobachten", "Tausch binnen 4 Wo.", "SOFORT SPERREN", "Stift ersetzen", "Anker nachziehen"], key=f"mass_{iter_key}")
-
-with col3:
-    st.write("📸 **Dokumentation**")
-    f1 = st.camera_input("1. Detailaufnahme (Schaden)", key=f"cam1_{iter_key}")
-    f2 = st.camera_input("2. Standortaufnahme (Übersicht)", key=f"cam2_{iter_key}")
-    f3 = st.camera_input("3. Traglastschild / Sonstiges", key=f"cam3_{iter_key}")
-
-# --- SPEICHERN ---
-if st.button("✅ Eintrag speichern & Formular leeren", use_container_width=True):
-    if not regal_nr:
-        st.error("Bitte Regal-Nummer angeben!")
-    else:
-        new_photos = []
-        # Wenn wir bearbeiten, behalten wir alte Fotos, falls keine neuen gemacht wurden
-        if st.session_state.edit_index is not None:
-            new_photos = current_data.get("Fotos", [])
-            
-        for f in [f1, f2, f3]:
-            if f:
-                img = Image.open(f).convert("RGB")
-                path = f"img_{datetime.now().timestamp()}.jpg"
-                img.save(path)
-                new_photos.append(path)
-        
-        entry = {
-            "Regal": regal_nr, "Typ": regal_typ, "Bauteil": bauteil, "Position": pos,
-            "Stufe": gefahr, "Mangel": f"{mangel}: {kommentar}", "Massnahme": massnahme, "Fotos": new_photos
-        }
-        
-        if st.session_state.edit_index is not None:
-            st.session_state.inspections[st.session_state.edit_index] = entry
+# --- AUFZÄHLUNG (eigenes Fragment: Blättern/Löschen lädt nur die Liste neu) ---
+@st.fragment
+def mangelliste(kopf):
+    if st.session_state.inspections:
+        st.divider()
+        st.subheader("📋 Aktuelle Mängelliste")
+        sichtbar, tabellen_modus = liste.ansicht(st.session_state.inspections, eintrag.BAUTEILE.optionen, key="liste")
+        if tabellen_modus:
+            geaendert = liste.tabelle(st.session_state.inspections, sichtbar, {
+                "Bauteil": eintrag.BAUTEILE.optionen, "Stufe": eintrag.STUFEN.optionen,
+                "Massnahme": eintrag.MASSNAHMEN.optionen}, key="liste")
+            for i in geaendert:
+                speicher.eintrag_speichern(st.session_state.sitzung, st.session_state.inspections[i], ans_ende=False)
+                bericht.vorbereiten(st.session_state.inspections[i])
+            if geaendert:
+                liste.neu_laden()
         else:
-            st.session_state.inspections.append(entry)
-        
-        reset_form()
-        st.rerun()
-
-# --- AUFZÄHLUNG ---
-if st.session_state.inspections:
+            for idx in sichtbar:
+                item = st.session_state.inspections[idx]
+                c_i, c_e, c_d = st.columns([7, 2, 1])
+                icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
+                c_i.write(f"{icon} **#{idx+1} Regal {item['Regal']}** | {item['Bauteil']} ({item['Position']})" + (" ⏳" if bilder.ausstehend(item['Fotos']) else ""))
+                if c_e.button("✏️", key=f"edit_btn_{idx}"):
+                    st.session_state.edit_index = idx
+                    st.session_state.form_iteration += 1  # neue Widget-Keys, sonst bleiben die alten Werte stehen
+                    st.rerun()  # Formular muss neu befüllt werden
+                if c_d.button("🗑️", key=f"del_btn_{idx}"):
+                    speicher.eintrag_loeschen(st.session_state.inspections.pop(idx))
+                    liste.neu_laden()
+
+        # --- PDF ---
+        klein = st.toggle("📉 Kleine Datei (Fotos komprimiert, für den Download unterwegs)",
+                          value=bericht.MODUS == "optimiert", key="pdf_klein")
+        if st.button("📄 PDF-Bericht erstellen", type="primary", use_container_width=True):
+            kopf = dict(kopf, Datum=datetime.now().strftime('%d.%m.%Y'))
+            st.session_state.pdf_job = jobs.starten(f"Bericht {kopf['Kunde']}", bericht.bericht_laden, kopf, list(st.session_state.inspections),
+                                                    "optimiert" if klein else "standard")
+        jobs.anzeigen(st.session_state.get("pdf_job"), "📥 PDF Herunterladen", f"Bericht_{kopf['Kunde']}.pdf", key="dl_bericht")
+
+
+# --- EINGABEMASKE (Fragment: Speichern lädt nur Formular + Liste neu, nicht die ganze Seite) ---
+@st.fragment
+@messung.gemessen("eingabe")
+def eingabe(kopf):
     st.divider()
-    st.subheader("📋 Aktuelle Mängelliste")
-    for idx, item in enumerate(st.session_state.inspections):
-        c_i, c_e, c_d = st.columns([7, 2, 1])
-        icon = "🟢" if item['Stufe'] == "Grün" else "🟡" if item['Stufe'] == "Gelb" else "🔴"
-        c_i.write(f"{icon} **#{idx+1} Regal {item['Regal']}** | {item['Bauteil']} ({item['Position']})")
-        if c_e.button("✏️", key=f"edit_btn_{idx}"):
-            st.session_state.edit_index = idx
-            st.rerun()
-        if c_d.button("🗑️", key=f"del_btn_{idx}"):
-            st.session_state.inspections.pop(idx)
-            st.rerun()
-
-    # --- PDF ---
-    if st.button("📄 PDF-Bericht erstellen", type="primary", use_container_width=True):
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=20)
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 24)
-        pdf.cell(0, 40, "Inspektionsbericht Regalanlagen", ln=True, align='C')
-        pdf.set_font("Arial", '', 14)
-        pdf.cell(0, 10, f"Kunde: {kunde}", ln=True)
-        pdf.cell(0, 10, f"Standort: {standort} | Prüfer: {inspektor}", ln=True)
-        pdf.ln(10)
-        
-        for item in st.session_state.inspections:
-            if pdf.get_y() > 160: pdf.add_page()
-            if item['Stufe'] == "ROT": pdf.set_fill_color(255, 200, 200)
-            elif item['Stufe'] == "Gelb": pdf.set_fill_color(255, 243, 200)
-            else: pdf.set_fill_color(200, 255, 200)
-            
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(0, 12, f"REGAL: {item['Regal']} - STATUS: {item['Stufe']}", ln=True, fill=True)
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(45, 8, "Bauteil:", ln=0); pdf.set_font("Arial", '', 12); pdf.cell(0, 8, f"{item['Bauteil']}", ln=True)
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(45, 8, "Position:", ln=0); pdf.set_font("Arial", '', 12); pdf.cell(0, 8, f"{item['Position']}", ln=True)
-            pdf.set_font("Arial", 'B', 12); pdf.cell(0, 8, "Beschreibung:", ln=True)
-            pdf.set_font("Arial", '', 11); pdf.multi_cell(0, 7, f"{item['Mangel']}\nMassnahme: {item['Massnahme']}")
-            
-            if item['Fotos']:
-                pdf.ln(3)
-                y_imgs, x_imgs = pdf.get_y(), 10
-                for p in item['Fotos'][:3]:
-                    if os.path.exists(p):
-                        pdf.image(p, x=x_imgs, y=y_imgs, w=45)
-                        x_imgs += 50
-                pdf.set_y(y_imgs + 42)
-            pdf.ln(5); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(10)
-
-        pdf_bytes = pdf.output(dest='S').encode('latin-1', 'replace')
-        st.download_button("📥 PDF Herunterladen", data=pdf_bytes, file_name=f"Bericht_{kunde}.pdf")
\ No newline at end of file
+    if st.session_state.edit_index is not None:
+        st.warning(f"🔄 Bearbeitung: Eintrag #{st.session_state.edit_index + 1}")
+        current_data = st.session_state.inspections[st.session_state.edit_index]
+    else:
+        # Standardwerte für ein leeres Formular
+        current_data = eintrag.Eintrag()
+
+    # Nutze den iteration_key um Felder nach dem Speichern zu leeren
+    iter_key = st.session_state.form_iteration
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    with col1:
+        regal_nr = st.text_input("Regal-Nummer", value=current_data.regal, placeholder="z.B. R-001", key=f"regal_{iter_key}")
+        regal_typ = st.selectbox("Regalanlage", eintrag.TYPEN.optionen, index=eintrag.TYPEN.index(current_data.typ),
+                                 key=f"typ_{iter_key}")
+        bauteil = st.selectbox("Bauteil", eintrag.BAUTEILE.optionen, index=eintrag.BAUTEILE.index(current_data.bauteil),
+                               key=f"bt_{iter_key}")
+
+        # Dynamische Platzhalter
+        p_hold = "z.B. Pfosten vorne links" if bauteil == "Stütze" else "z.B. Ebene 3, Feld 10" if bauteil == "Traverse" else "Genaue Lage"
+        pos = st.text_input("Position / Ebene / Feld", value=current_data.position, placeholder=p_hold, key=f"pos_{iter_key}")
+
+    with col2:
+        st.write("**Gefahrenstufe:**")
+        gefahr = st.radio("Status", eintrag.STUFEN.optionen, index=eintrag.STUFEN.index(current_data.stufe),
+                          horizontal=True, key=f"stufe_{iter_key}")
+        mangel = st.selectbox("Hauptmangel", eintrag.MAENGEL.optionen, index=eintrag.MAENGEL.index(current_data.mangel),
+                              key=f"mangel_{iter_key}")
+        kommentar = st.text_input("Zusatz-Kommentar (Vorschlag)", value=current_data.kommentar, placeholder="z.B. Delle > 3mm",
+                                  key=f"kommentar_{iter_key}")
+        massnahme = st.selectbox("Maßnahme", eintrag.MASSNAHMEN.optionen, index=eintrag.MASSNAHMEN.index(current_data.massnahme),
+                                 key=f"mass_{iter_key}")
+
+    with col3:
+        st.write("📸 **Dokumentation**")
+        f1 = st.camera_input("1. Detailaufnahme (Schaden)", key=f"cam1_{iter_key}")
+        f2 = st.camera_input("2. Standortaufnahme (Übersicht)", key=f"cam2_{iter_key}")
+        f3 = st.camera_input("3. Traglastschild / Sonstiges", key=f"cam3_{iter_key}")
+
+    # --- SPEICHERN ---
+    if st.button("✅ Eintrag speichern & Formular leeren", use_container_width=True):
+        if not regal_nr:
+            st.error("Bitte Regal-Nummer angeben!")
+        else:
+            new_photos = []
+            # Wenn wir bearbeiten, behalten wir alte Fotos, falls keine neuen gemacht wurden
+            if st.session_state.edit_index is not None:
+                new_photos = list(current_data.fotos)
+
+            for f in [f1, f2, f3]:
+                if f:
+                    new_photos.append(bilder.ingest_async(f))
+
+            entry = eintrag.Eintrag(regal_nr, regal_typ, bauteil, pos, gefahr, mangel, kommentar, massnahme, new_photos)
+
+            if st.session_state.edit_index is not None:
+                entry.id = current_data.id
+                speicher.eintrag_speichern(st.session_state.sitzung, entry, ans_ende=False)
+                st.session_state.inspections[st.session_state.edit_index] = entry
+            else:
+                speicher.eintrag_speichern(st.session_state.sitzung, entry)
+                st.session_state.inspections.append(entry)
+            bericht.vorbereiten(entry)
+
+            reset_form()
+            liste.neu_laden()
+
+    # --- MASSENIMPORT ---
+    neu = massenimport.anzeigen({"Bauteil": eintrag.BAUTEILE.optionen, "Stufe": eintrag.STUFEN.optionen,
+                                 "Mangel": eintrag.MAENGEL.optionen, "Massnahme": eintrag.MASSNAHMEN.optionen})
+    if neu is not None:
+        items = massenimport.eintraege(neu)
+        speicher.eintraege_speichern(st.session_state.sitzung, items)
+        for e in items:
+            bericht.vorbereiten(e)
+        st.session_state.inspections.extend(items)
+        liste.neu_laden()
+
+    mangelliste(kopf)
+
+
+eingabe({"Kunde": kunde, "Standort": standort, "Bereich": gebaeude, "Pruefer": inspektor})
+messung.panel(st.session_state.sitzung)
+messung.skript_ende()
\ No newline at end of file
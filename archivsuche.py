@@ -0,0 +1,59 @@
+import pandas as pd
+import streamlit as st
+import speicher
+
+# --- KONFIGURATION ---
+TREFFER_MAX = 200
+STUFEN = {"Grün": 0, "Gelb": 1, "ROT": 2}
+SYMBOL = {"Grün": "🟢", "Gelb": "🟡", "ROT": "🔴"}
+
+
+def verlauf(kunde, regal):
+    # Eine Zeile pro Prüfung (älteste zuerst): schlimmste Stufe und alle Mängel des Regals in diesem Bericht
+    pruefungen = {}
+    for e in speicher.regal_verlauf(kunde, regal):
+        p = pruefungen.setdefault(e["bericht_id"], {"Datum": e["Datum"], "Bereich": e["Bereich"], "Stufe": "Grün",
+                                                    "Mängel": []})
+        if STUFEN.get(e["Stufe"], 0) > STUFEN[p["Stufe"]]:
+            p["Stufe"] = e["Stufe"]
+        p["Mängel"].append(f"{e['Bauteil']} ({e['Position']}): {e['Mangel']} -> {e['Massnahme']}")
+    return list(pruefungen.values())
+
+
+def trend(pruefungen):
+    if len(pruefungen) < 2:
+        return ""
+    alt, neu = STUFEN[pruefungen[-2]["Stufe"]], STUFEN[pruefungen[-1]["Stufe"]]
+    return "↗️ schlechter" if neu > alt else "↘️ besser" if neu < alt else "➡️ unverändert"
+
+
+# --- ANSICHT ---
+@st.fragment
+def anzeigen(kunde=None):
+    c_q, c_alle = st.columns([4, 1])
+    text = c_q.text_input("🔎 Archiv durchsuchen", placeholder="z.B. R-017, Stapler, Traverse Ebene 3", key="suche_text")
+    alle = c_alle.toggle("Alle Kunden", key="suche_alle") or not kunde
+    if not text:
+        st.caption("Sucht in Regal, Position, Bauteil und Mangel aller abgeschlossenen Berichte (Wortanfänge genügen).")
+        return
+
+    treffer = speicher.suchen(text, None if alle else kunde, TREFFER_MAX)
+    st.caption(f"{len(treffer)}{'+' if len(treffer) == TREFFER_MAX else ''} Treffer, neueste zuerst")
+    if not treffer:
+        return
+    st.dataframe(treffer, hide_index=True, use_container_width=True,
+                 column_order=["Kunde", "Datum", "Bereich", "Regal", "Bauteil", "Position", "Stufe", "Mangel", "Massnahme"])
+
+    # --- VERLAUF JE REGAL ---
+    regale = list(dict.fromkeys((t["Kunde"], t["Regal"]) for t in treffer))
+    k, regal = st.selectbox("📈 Verlauf für Regal", regale, key="suche_regal",
+                            format_func=lambda kr: f"{kr[1]} ({kr[0]})" if alle else kr[1])
+    pruefungen = verlauf(k, regal)
+    st.write(f"**Regal {regal}: {len(pruefungen)} Prüfung(en) mit Mängeln** {trend(pruefungen)}")
+    if len(pruefungen) > 1:
+        datum = pd.to_datetime([p["Datum"] for p in pruefungen], format="%d.%m.%Y", errors="coerce")
+        st.line_chart(pd.DataFrame({"Stufe (0 = Grün, 2 = ROT)": [STUFEN[p["Stufe"]] for p in pruefungen]},
+                                   index=datum), height=200)
+    st.dataframe([{"Datum": p["Datum"], "Bereich": p["Bereich"], "Status": f"{SYMBOL[p['Stufe']]} {p['Stufe']}",
+                   "Mängel": "\n".join(p["Mängel"])} for p in reversed(pruefungen)],
+                 hide_index=True, use_container_width=True)
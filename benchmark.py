@@ -0,0 +1,354 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Alles in ein Wegwerf-Verzeichnis, bevor die App-Module ihre Konfiguration lesen
+# (Export-Prozesse importieren dieses Skript erneut und müssen dasselbe Verzeichnis sehen)
+ARBEIT = os.environ.get("REGAL_BENCH_DIR") or tempfile.mkdtemp(prefix="regal_bench_")
+os.environ.update({
+    "REGAL_BENCH_DIR": ARBEIT,
+    "REGAL_DB": os.path.join(ARBEIT, "bench.db"),
+    "REGAL_FOTO_DIR": os.path.join(ARBEIT, "fotos"),
+    "REGAL_PDF_CACHE_MB": "0",  # jeder Bericht wird wirklich gebaut
+    "REGAL_PDF_CACHE_DIR": os.path.join(ARBEIT, "pdf"),
+    "REGAL_KUNDEN_CSV": "",
+    "REGAL_MESSUNG": "1",  # Formular-Zeiten kommen aus messung
+})
+HIER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HIER)
+
+import numpy as np
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+import bericht
+import bilder
+import eintrag
+import journal
+import messung
+import speicher
+
+# --- KONFIGURATION ---
+LISTEN = [10, 100, 500, 1000, 5000]
+FOTO_GROESSEN = [(1280, 720), (4032, 3024)]  # Browser-Kamera, Handy-Foto
+PDF_EINTRAEGE = [10, 100, 500, 2000]
+PDF_FOTOS = [0, 1, 3]
+FOTO_POOL = 30  # so viele verschiedene Fotos werden auf die PDF-Einträge verteilt
+ARCHIV = [10, 100, 1000]
+SYNC_EINTRAEGE = [100, 1000]  # Journal -> Fake-Sheet, je einmal ohne und mit wackeliger Verbindung
+SYNC_FEHLERQUOTEN = [0.0, 0.3]
+SYNC_BATCH = 25  # kleine Batches -> viele Anfragen, damit die Fehlerquote auch wirklich greift
+EXPORT_BERICHTE = [8, 32]  # Sammel-Export, je 20 Einträge mit einem Foto
+LAST_SITZUNGEN = 20  # gleichzeitige Prüfer auf demselben Kunden
+LAST_EINTRAEGE = 25  # je Prüfer, jeder mit 3 Fotos
+WIEDERHOLUNGEN = 5
+
+ergebnisse = []
+probleme = []
+
+
+def messen(messung, parameter, **werte):
+    ergebnisse.append({"messung": messung, "parameter": parameter, **{k: round(v, 2) for k, v in werte.items()}})
+    print(f"{messung:<14} {json.dumps(parameter, ensure_ascii=False):<45} "
+          + "  ".join(f"{k}={v:.1f}" for k, v in werte.items()), flush=True)
+
+
+def kennzahlen(zeiten):
+    zeiten = sorted(zeiten)
+    return {"median_ms": statistics.median(zeiten), "p95_ms": zeiten[int(0.95 * (len(zeiten) - 1))]}
+
+
+# --- TESTDATEN ---
+def kamera_foto(breite, hoehe, seed=0):
+    # Rauschen + Verlauf: komprimiert ähnlich schlecht wie ein echtes Foto
+    rng = np.random.default_rng(seed)
+    verlauf = np.linspace(0, 255, breite, dtype=np.float32)[None, :, None]
+    pixel = np.clip(verlauf + rng.normal(0, 40, (hoehe, breite, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixel).save(buf, "JPEG", quality=90)
+    buf.seek(0)
+    buf.name = "kamera.jpg"
+    return buf
+
+
+def eintraege(n, fotos=()):
+    return [eintrag.Eintrag(f"R-{i:04d}", "Palettenregal", ["Stütze", "Traverse"][i % 2], f"Ebene {i % 6}",
+                            ["Grün", "Gelb", "ROT"][i % 3], "Stapleranprall", "Delle", "Beobachten",
+                            [fotos[(i + k) % len(fotos)] for k in range(min(len(fotos), 3))] if fotos else [])
+            for i in range(n)]
+
+
+# --- MESSUNGEN ---
+def app_laeufe(datei, sitzung, kunde=None, laeufe=WIEDERHOLUNGEN):
+    at = AppTest.from_file(os.path.join(HIER, datei), default_timeout=300)
+    at.query_params["s"] = sitzung
+    at.run()
+    if kunde:
+        at.selectbox(key="kunde_wahl").set_value(kunde).run()
+    if at.exception:
+        raise RuntimeError(f"{datei}: {at.exception[0].value}")
+    zeiten = []
+    for _ in range(laeufe):
+        t0 = time.perf_counter()
+        at.run()
+        zeiten.append((time.perf_counter() - t0) * 1000)
+    return at, zeiten
+
+
+def rerun_latenz(listen):
+    for n in listen:
+        # app.py: Entwurf pro Sitzung; app.py.py: gemeinsamer Entwurf pro Kunde
+        for datei, kunde in [("app.py", None), ("app.py.py", f"Bench {n}")]:
+            sitzung = f"bench-{datei}-{n}"
+            speicher.eintraege_speichern(f"kunde:{kunde}" if kunde else sitzung, eintraege(n))
+            at, zeiten = app_laeufe(datei, sitzung, kunde)
+            fragment = messung.werte("eingabe", sitzung)
+            werte = kennzahlen(zeiten)
+            if fragment:
+                werte["eingabe_p95_ms"] = kennzahlen(fragment)["p95_ms"]
+            messen("rerun", {"app": datei, "eintraege": n}, **werte)
+
+
+def foto_speichern(groessen):
+    for breite, hoehe in groessen:
+        handler, kodieren = [], []
+        for i in range(WIEDERHOLUNGEN):
+            foto = kamera_foto(breite, hoehe, seed=breite + i)
+            # Was der Knopfdruck kostet: Upload lesen + Job abgeben + Eintrag speichern
+            t0 = time.perf_counter()
+            future = bilder.ingest_async(foto)
+            speicher.eintrag_speichern(f"bench-foto-{breite}", eintraege(1)[0].kopie(Fotos=[future]))
+            handler.append((time.perf_counter() - t0) * 1000)
+            # Was im Hintergrund passiert: verkleinern, Thumbnail, atomar schreiben
+            t0 = time.perf_counter()
+            future.result()
+            kodieren.append((time.perf_counter() - t0) * 1000)
+        messen("foto", {"breite": breite, "hoehe": hoehe},
+               handler_ms=statistics.median(handler), fertig_ms=statistics.median(kodieren))
+
+
+def pdf_bau(anzahlen, fotos_je):
+    pool = [bilder.ingest(kamera_foto(1280, 720, seed=1000 + i)) for i in range(FOTO_POOL)]
+    for modus in bericht.MODI:
+        bericht._druckfertig([{"Fotos": pool}], modus)  # einmalige Vorskalierung nicht der ersten Messung anrechnen
+    for modus in bericht.MODI:
+        for n in anzahlen:
+            for k in fotos_je:
+                daten = eintraege(n, pool if k else ())
+                for item in daten:
+                    item["Fotos"] = item["Fotos"][:k]
+                kopf = {"Kunde": "Bench AG", "Standort": "Zürich", "Bereich": "Halle A", "Datum": "01.01.2026"}
+                # Zwei Läufe mit unterschiedlichem Schlüssel: einmal Zeit, einmal Speicher (tracemalloc bremst)
+                bericht.bloecke.leeren()  # kalt: gleiche R-0000... Einträge hat schon die kleinere Größe gerendert
+                t0 = time.perf_counter()
+                ergebnis = bericht.bericht_laden(dict(kopf, Pruefer=f"zeit-{n}-{k}"), daten, modus)
+                ms = (time.perf_counter() - t0) * 1000
+                groesse = len(ergebnis() if callable(ergebnis) else ergebnis)
+                # Gleicher Inhalt, neuer Schlüssel: die Einträge sind jetzt vorgerendert, es wird nur zusammengesetzt
+                t0 = time.perf_counter()
+                bericht.bericht_laden(dict(kopf, Pruefer=f"bloecke-{n}-{k}"), daten, modus)
+                vorgerendert_ms = (time.perf_counter() - t0) * 1000
+                tracemalloc.start()
+                bericht.bericht_laden(dict(kopf, Pruefer=f"speicher-{n}-{k}"), daten, modus)
+                spitze = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                messen("pdf", {"eintraege": n, "fotos_je_eintrag": k, "modus": modus},
+                       ms=ms, vorgerendert_ms=vorgerendert_ms, spitze_mb=spitze / 1e6, pdf_kb=groesse / 1024)
+
+
+def archiv_tab(anzahlen, je_bericht=50):
+    vorhanden = 0
+    for n in anzahlen:
+        for i in range(vorhanden, n):
+            sitzung = f"bench-archiv-{i}"
+            speicher.eintraege_speichern(sitzung, eintraege(je_bericht))
+            speicher.bericht_abschliessen(sitzung, "Archiv AG", "01.01.2026", "Zürich", f"Halle {i % 4}")
+        vorhanden = n
+        _, zeiten = app_laeufe("app.py.py", f"bench-archiv-leer-{n}", "Archiv AG")
+        messen("archiv", {"berichte": n, "eintraege_je_bericht": je_bericht}, **kennzahlen(zeiten))
+
+
+def last(sitzungen, je_sitzung):
+    # Alle Prüfer starten gleichzeitig und speichern je Eintrag drei Fotos auf einmal in denselben Kunden-Entwurf
+    entwurf = "kunde:Last AG"
+    start = threading.Barrier(sitzungen)
+    zeiten, fehler, futures = [], [], []
+
+    def pruefer(s):
+        try:
+            start.wait()
+            for i in range(je_sitzung):
+                fotos = [kamera_foto(320, 240, seed=(s * je_sitzung + i) * 3 + k) for k in range(3)]
+                t0 = time.perf_counter()
+                item = eintraege(1)[0].kopie(Regal=f"S{s:02d}-{i:03d}", _von=f"last-{s}",
+                                             Fotos=[bilder.ingest_async(f) for f in fotos])
+                speicher.eintrag_speichern(entwurf, item)
+                zeiten.append((time.perf_counter() - t0) * 1000)
+                futures.extend(item["Fotos"])
+        except Exception as e:
+            fehler.append(repr(e))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=pruefer, args=(s,)) for s in range(sitzungen)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for f in futures:
+        f.result()
+    dauer = time.perf_counter() - t0
+
+    # Konsistenz: nichts verloren, keine doppelte Position, jedes Foto eine eigene Datei
+    erwartet = sitzungen * je_sitzung
+    con = sqlite3.connect(os.environ["REGAL_DB"])
+    aus_entwurf = ("FROM berichte b JOIN eintraege e ON e.bericht_id = b.id LEFT JOIN fotos f ON f.eintrag_id = e.id "
+                   "WHERE b.sitzung = ? AND b.abgeschlossen = 0")
+    for _ in range(100):  # Foto-Pfade kommen per Callback nach, bis dahin stehen Platzhalter in den Zeilen
+        if not con.execute(f"SELECT COUNT(*) {aus_entwurf} AND f.pfad LIKE ?", (entwurf, speicher.AUSSTEHEND + "%")).fetchone()[0]:
+            break
+        time.sleep(0.1)
+    n, nrs, regale, pfade = con.execute(
+        f"SELECT COUNT(DISTINCT e.id), COUNT(DISTINCT e.nr), COUNT(DISTINCT e.regal), COUNT(DISTINCT f.pfad) {aus_entwurf}",
+        (entwurf,)).fetchone()
+    fehlende = sum(not os.path.exists(p) for (p,) in con.execute(f"SELECT f.pfad {aus_entwurf} AND f.pfad IS NOT NULL", (entwurf,)))
+    con.close()
+    if fehler or n != erwartet or nrs != erwartet or regale != erwartet or pfade != 3 * erwartet or fehlende:
+        probleme.append(f"Lasttest: {len(fehler)} Fehler, {n}/{erwartet} Einträge, {nrs} Positionen, "
+                        f"{pfade}/{3 * erwartet} Fotos, {fehlende} Dateien fehlen {fehler[:1]}")
+    messen("last", {"sitzungen": sitzungen, "eintraege_je_sitzung": je_sitzung},
+           **kennzahlen(zeiten), eintraege_pro_s=erwartet / dauer, fehler=len(fehler))
+
+
+# --- AUSGABE ---
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HIER,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def vergleichen(vorher):
+    # Median / Zeit des letzten Laufs gegenüber diesem Lauf, gleiche Messung + Parameter
+    alt = {(e["messung"], json.dumps(e["parameter"], sort_keys=True)): e for e in vorher["ergebnisse"]}
+    print(f"\nVergleich mit {vorher['commit']} ({vorher['zeit']}):")
+    for e in ergebnisse:
+        a = alt.get((e["messung"], json.dumps(e["parameter"], sort_keys=True)))
+        feld = "median_ms" if "median_ms" in e else "ms" if "ms" in e else "handler_ms"
+        if a and a.get(feld):
+            print(f"  {e['messung']:<8} {json.dumps(e['parameter'], ensure_ascii=False):<45} "
+                  f"{feld} {a[feld]:.1f} -> {e[feld]:.1f} ({(e[feld] / a[feld] - 1) * 100:+.0f}%)")
+
+
+def export(anzahlen, je_bericht=20):
+    pool = [bilder.ingest(kamera_foto(1280, 720, seed=2000 + i)) for i in range(FOTO_POOL)]
+    ids = []
+    for n in anzahlen:
+        for i in range(len(ids), n):
+            sitzung = f"bench-export-{i}"
+            speicher.eintraege_speichern(sitzung, eintraege(je_bericht, pool[i % FOTO_POOL:][:1]))
+            ids.append(speicher.bericht_abschliessen(sitzung, "Export AG", "01.01.2026", "Zürich", f"Halle {i}"))
+        for prozesse in sorted({1, os.cpu_count()}):
+            bericht.EXPORT_PROZESSE, bericht._prozesse = prozesse, None
+            bericht.stapel_laden(ids[:1])  # Prozesse starten nicht der Messung anrechnen
+            for f in os.listdir(bericht.SPOOL_DIR):
+                os.remove(os.path.join(bericht.SPOOL_DIR, f))  # kalt: kein PDF vorhanden
+            t0 = time.perf_counter()
+            groesse = len(bericht.stapel_laden(ids[:n])())
+            kalt_ms = (time.perf_counter() - t0) * 1000
+            for f in os.listdir(bericht.SPOOL_DIR):
+                if f.endswith(".zip"):
+                    os.remove(os.path.join(bericht.SPOOL_DIR, f))  # warm: PDFs da, nur das ZIP fehlt
+            t0 = time.perf_counter()
+            bericht.stapel_laden(ids[:n])
+            warm_ms = (time.perf_counter() - t0) * 1000
+            bericht._prozesse.shutdown()
+            messen("export", {"berichte": n, "prozesse": prozesse}, kalt_ms=kalt_ms, warm_ms=warm_ms,
+                   zip_kb=groesse / 1024, berichte_je_s=n / kalt_ms * 1000)
+
+
+def sync(anzahlen, quoten):
+    # Journal -> CsvZiel: nichts verloren, nichts doppelt (quittiert wird nur nach erfolgreichem Upload)
+    journal.BATCH = SYNC_BATCH
+    for n in anzahlen:
+        sitzung = f"bench-sync-{n}"
+        speicher.eintraege_speichern(sitzung, eintraege(n))
+        speicher.bericht_abschliessen(sitzung, "Sync AG", "01.01.2026", "Zürich", "Halle S")
+        for quote in quoten:
+            ziel = journal.CsvZiel(os.path.join(ARBEIT, f"sheet-{n}-{quote}"), quote)
+            ziel.name = f"bench-{n}-{quote}"  # eigener Journal-Stand je Lauf -> jeder lädt das ganze Journal
+            erwartet = {blatt: speicher.journal_offen(0, arten) for blatt, (arten, _, _) in journal.BLAETTER.items()}
+            random.seed(n)  # gleiche Fehlerfolge in jedem Lauf
+            t0 = time.perf_counter()
+            s = journal.Sync(ziel, intervall=0.02)
+            while s.offen() and time.perf_counter() - t0 < 120:
+                time.sleep(0.02)
+            dauer_ms = (time.perf_counter() - t0) * 1000
+            s.stoppen()
+            for blatt, soll in erwartet.items():
+                with open(os.path.join(ziel.verzeichnis, f"{blatt}.csv"), encoding="utf-8") as fh:
+                    ids = [zeile.split(",", 1)[0] for zeile in list(fh)[1:]]
+                if len(ids) != soll or len(set(ids)) != soll:
+                    probleme.append(f"Sync {blatt} (Quote {quote}): {len(set(ids))}/{soll} Zeilen, {len(ids) - len(set(ids))} doppelt")
+            messen("sync", {"journal": sum(erwartet.values()), "fehlerquote": quote}, ms=dauer_ms,
+                   anfragen=ziel.anfragen, fehlgeschlagen=ziel.anfragen - sum(-(-v // SYNC_BATCH) for v in erwartet.values()))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Regal-Check Benchmarks (ohne Browser, über streamlit.testing)")
+    ap.add_argument("--schnell", action="store_true", help="nur kleine Größen, z.B. vor jedem Commit")
+    ap.add_argument("--nur", choices=["rerun", "foto", "pdf", "archiv", "export", "sync", "last"], action="append")
+    ap.add_argument("--aus", default=os.path.join(HIER, "benchmark.jsonl"),
+                    help="Ergebnisse werden als eine JSON-Zeile pro Lauf angehängt")
+    args = ap.parse_args()
+    logging.getLogger("streamlit.deprecation_util").disabled = True  # sonst pro Lauf seitenweise Hinweise
+    for kunde in [f"Bench {n}" for n in LISTEN] + ["Archiv AG", "Export AG", "Sync AG"]:
+        speicher.kunde_anlegen(kunde)  # vor dem ersten App-Lauf, sonst fehlen sie im Kundenindex
+
+    nur = set(args.nur or ["rerun", "foto", "pdf", "archiv", "export", "sync", "last"])
+    if "rerun" in nur:
+        rerun_latenz(LISTEN[:3] if args.schnell else LISTEN)
+    if "foto" in nur:
+        foto_speichern(FOTO_GROESSEN[:1] if args.schnell else FOTO_GROESSEN)
+    if "pdf" in nur:
+        pdf_bau(PDF_EINTRAEGE[:2] if args.schnell else PDF_EINTRAEGE, PDF_FOTOS)
+    if "archiv" in nur:
+        archiv_tab(ARCHIV[:2] if args.schnell else ARCHIV)
+    if "export" in nur:
+        export(EXPORT_BERICHTE[:1] if args.schnell else EXPORT_BERICHTE)
+    if "sync" in nur:
+        sync(SYNC_EINTRAEGE[:1] if args.schnell else SYNC_EINTRAEGE, SYNC_FEHLERQUOTEN)
+    if "last" in nur:
+        last(LAST_SITZUNGEN, 5 if args.schnell else LAST_EINTRAEGE)
+
+    lauf = {"zeit": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit(), "python": platform.python_version(),
+            "rechner": platform.node(), "budget_ms": messung.BUDGET_MS, "ergebnisse": ergebnisse}
+    vorher = None
+    if os.path.exists(args.aus):
+        with open(args.aus, encoding="utf-8") as fh:
+            zeilen = [z for z in fh if z.strip()]
+        vorher = json.loads(zeilen[-1]) if zeilen else None
+    with open(args.aus, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(lauf, ensure_ascii=False) + "\n")
+    if vorher:
+        vergleichen(vorher)
+
+    shutil.rmtree(ARBEIT, ignore_errors=True)  # nur hier, nicht beim Import (Export-Prozesse laden das Skript auch)
+    ueber = [e for e in ergebnisse if e.get("eingabe_p95_ms", 0) > messung.BUDGET_MS]
+    for e in ueber:
+        print(f"⚠️ Budget {messung.BUDGET_MS} ms überschritten: {e['parameter']} p95 {e['eingabe_p95_ms']:.0f} ms")
+    for p in probleme:
+        print(f"⚠️ {p}")
+    sys.exit(1 if ueber or probleme else 0)
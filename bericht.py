@@ -0,0 +1,497 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from fpdf import FPDF
+import bilder
+import messung
+import speicher
+
+# --- KONFIGURATION ---
+CACHE_MB = int(os.environ.get("REGAL_PDF_CACHE_MB", "256"))
+CACHE_DIR = os.environ.get("REGAL_PDF_CACHE_DIR", "")  # leer = Cache nur im RAM; auf Platte gilt SPOOL_MB, nicht CACHE_MB
+STREAM_AB = int(os.environ.get("REGAL_PDF_STREAM_AB", "150"))  # ab so vielen Einträgen direkt in Datei
+SPOOL_DIR = CACHE_DIR or os.path.join(tempfile.gettempdir(), "regal_pdf")
+# Obergrenze für SPOOL_DIR (= CACHE_DIR, falls gesetzt), 0 = keine; eingehalten beim Foto-Aufräumen (REGAL_FOTO_AUFRAEUMEN)
+SPOOL_MB = int(os.environ.get("REGAL_PDF_SPOOL_MB", "1024"))
+BLOECKE_MAX = int(os.environ.get("REGAL_PDF_BLOECKE", "20000"))  # vorgerenderte Einträge im RAM
+EXPORT_STUNDEN = int(os.environ.get("REGAL_EXPORT_STUNDEN", "24"))  # so lange bleibt ein Export-ZIP abholbar
+EXPORT_PROZESSE = int(os.environ.get("REGAL_EXPORT_PROZESSE", "0")) or os.cpu_count()  # Sammel-Export, 0 = ein Prozess je Kern
+MODUS = os.environ.get("REGAL_PDF_MODUS", "standard")  # Vorgabe im Formular und fürs Vorrendern; "optimiert" nur auf Wunsch
+# Modus -> (DPI, JPEG-Qualität) der eingebetteten Fotos; "optimiert" für den Download übers Handynetz
+MODI = {
+    "standard": (bilder.DRUCK_DPI, bilder.JPEG_QUALITAET),
+    "optimiert": (int(os.environ.get("REGAL_PDF_OPT_DPI", "150")), int(os.environ.get("REGAL_PDF_OPT_QUALITAET", "60"))),
+}
+_HASH_NAME = re.compile(r"^[0-9a-f]{32}\.jpg$")  # Dateiname = Inhalts-Hash (bilder.ingest)
+
+
+def _farbe(pdf, stufe):
+    if stufe == "ROT": pdf.set_fill_color(255, 200, 200)
+    elif stufe == "Gelb": pdf.set_fill_color(255, 243, 200)
+    else: pdf.set_fill_color(200, 255, 200)
+
+
+# --- LAYOUTS ---
+def _bericht_block(pdf, item):
+    _farbe(pdf, item['Stufe'])
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(0, 12, f"REGAL: {item['Regal']} - STATUS: {item['Stufe']}", ln=True, fill=True)
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(45, 8, "Bauteil:", ln=0)
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 8, f"{item['Bauteil']}", ln=True)
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(45, 8, "Position / Ebene:", ln=0)
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 8, f"{item['Position']}", ln=True)
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 8, "Schadensbeschreibung:", ln=True)
+    pdf.set_font("Arial", '', 11)
+    pdf.multi_cell(0, 7, f"{item['Mangel']}\nMassnahme: {item['Massnahme']}")
+
+    # Bilder auf einer Ebene nebeneinander
+    if item['Fotos']:
+        pdf.ln(3)
+        y_imgs, x_imgs = pdf.get_y(), 10
+        for p in item['Fotos'][:3]: # Max 3 Bilder
+            pdf.image(p, x=x_imgs, y=y_imgs, w=45)
+            x_imgs += 50
+        pdf.set_y(y_imgs + 42)
+
+    pdf.ln(5)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(10)
+
+
+def _archiv_block(pdf, item):
+    _farbe(pdf, item['Stufe'])
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(0, 10, f"Regal {item['Regal']} - {item['Stufe']}", ln=True, fill=True)
+    pdf.set_font("Arial", '', 11)
+    pdf.multi_cell(0, 6, f"{item['Bauteil']} ({item['Position']})\n{item['Mangel']}\nMassnahme: {item['Massnahme']}")
+    if item['Fotos']:
+        pdf.ln(2); y, x = pdf.get_y(), 10
+        for f in item['Fotos']:
+            pdf.image(f, x=x, y=y, w=45); x += 50
+        pdf.set_y(y + 42)
+    pdf.ln(5); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
+
+
+# Layout -> (Block-Funktion, Felder, von denen der Block abhängt)
+LAYOUTS = {
+    "bericht": (_bericht_block, ("Regal", "Stufe", "Bauteil", "Position", "Mangel", "Massnahme", "Fotos")),
+    "archiv": (_archiv_block, ("Regal", "Stufe", "Bauteil", "Position", "Mangel", "Massnahme", "Fotos")),
+}
+
+
+def bericht_seiten(pdf, kopf, eintraege, fortschritt=None):
+    # Ausführlicher Bericht (Button "PDF-Bericht erstellen")
+    pdf.set_auto_page_break(auto=True, margin=20)
+
+    # Deckblatt
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 24)
+    pdf.cell(0, 40, "Inspektionsbericht Regalanlagen", ln=True, align='C')
+    pdf.set_font("Arial", '', 14)
+    pdf.cell(0, 10, f"Kunde: {kopf['Kunde']}", ln=True)
+    pdf.cell(0, 10, f"Standort: {kopf['Standort']} | Bereich: {kopf['Bereich']}", ln=True)
+    pdf.cell(0, 10, f"Prüfer: {kopf['Pruefer']} | Datum: {kopf['Datum']}", ln=True)
+    pdf.ln(10)
+
+    # Mängel-Details
+    for i, item in enumerate(eintraege):
+        if pdf.get_y() > 160: # Platz-Check für Block + Bilder
+            pdf.add_page()
+        bloecke.einsetzen(pdf, "bericht", item)
+        if fortschritt: fortschritt(i + 1, len(eintraege))
+
+
+def archiv_seiten(pdf, rep, fortschritt=None):
+    # Kompakter Bericht aus dem Archiv
+    pdf.set_auto_page_break(auto=True, margin=20)
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 20)
+    pdf.cell(0, 30, f"Bericht: {rep['Kunde']}", ln=True, align='C')
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 10, f"Datum: {rep['Datum']} | Standort: {rep.get('Standort','')}", ln=True)
+    pdf.ln(10)
+    for i, item in enumerate(rep["Details"]):
+        if pdf.get_y() > 200: pdf.add_page()
+        bloecke.einsetzen(pdf, "archiv", item)
+        if fortschritt: fortschritt(i + 1, len(rep["Details"]))
+
+
+# --- STREAMING ---
+class _DateiPuffer:
+    # Ersetzt FPDF.buffer: "+=" schreibt direkt in die Datei, len() ist die Byte-Position für die xref
+    def __init__(self, fh):
+        self.fh = fh
+        self.pos = 0
+
+    def __iadd__(self, s):
+        b = s.encode("latin-1", "replace")
+        self.fh.write(b)
+        self.pos += len(b)
+        return self
+
+    def __len__(self):
+        return self.pos
+
+
+class DateiPDF(FPDF):
+    # Bilddaten bleiben bis zum Schreiben auf der Platte, das Dokument geht stückweise in die Datei
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_compression(True)  # Seiteninhalte mit zlib (FlateDecode)
+        self._kanonisch = {}
+        self._inhalte = {}
+
+    def kanonisch(self, pfad):
+        # Gleicher Inhalt unter anderem Pfad (z.B. Altbestand temp_*.jpg) -> erster Pfad, Bild nur einmal eingebettet
+        if pfad not in self._kanonisch:
+            inhalt = pfad
+            if not _HASH_NAME.match(os.path.basename(pfad)):
+                with open(pfad, "rb") as fh:
+                    inhalt = hashlib.sha256(fh.read()).hexdigest()
+            self._kanonisch[pfad] = self._inhalte.setdefault(inhalt, pfad)
+        return self._kanonisch[pfad]
+
+    def image(self, name, *args, **kwargs):
+        return super().image(self.kanonisch(name), *args, **kwargs)
+
+    def _parsejpg(self, filename):
+        info = super()._parsejpg(filename)
+        del info['data']
+        info['datei'] = filename
+        return info
+
+    def _putimage(self, info):
+        if 'datei' in info and 'data' not in info:
+            with open(info['datei'], "rb") as fh:
+                info['data'] = fh.read()
+        super()._putimage(info)  # _putimages() gibt die Daten danach wieder frei
+
+    def schreiben(self, ziel):
+        os.makedirs(os.path.dirname(ziel), exist_ok=True)
+        tmp = f"{ziel}.{os.getpid()}.{threading.get_ident()}.tmp"  # auch Export-Prozesse schreiben in den Spool
+        with open(tmp, "wb") as fh:
+            self.buffer = _DateiPuffer(fh)
+            self.close()
+        os.replace(tmp, ziel)
+        self.buffer = ''
+        return ziel
+
+
+# --- BLÖCKE (jeder Eintrag einmal vorgerendert, der Bericht setzt sie nur noch zusammen) ---
+_FONT = re.compile(r"BT /F(\d+) ")
+_BILD = re.compile(r" cm /I(\d+) Do Q")
+_FAMILIEN = ("helvetica", "courier", "times", "symbol", "zapfdingbats")
+
+
+class BlockCache:
+    # Inhalts-Stream eines Eintrags, gerendert oben auf einer leeren Seite; beim Einsetzen nur verschoben.
+    # Schlüssel = Inhalt des Eintrags -> eine Änderung trifft genau diesen einen Block.
+    def __init__(self, max_bloecke):
+        self.max_bloecke = max_bloecke
+        self._bloecke = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rendern(self, layout, item):
+        with messung.span("pdf_block"):
+            pdf = DateiPDF()
+            pdf.set_auto_page_break(auto=True, margin=20)
+            pdf.add_page()
+            y0, start = pdf.get_y(), len(pdf.pages[1])
+            LAYOUTS[layout][0](pdf, item)
+            if pdf.page != 1:
+                return None  # länger als eine Seite: wird immer direkt gezeichnet
+            fonts = {v['i']: k for k, v in pdf.fonts.items()}
+            bilder_ = {v['i']: v for v in pdf.images.values()}
+            return {"stream": pdf.pages[1][start:], "y0": y0, "hoehe": pdf.get_y() - y0,
+                    "fonts": fonts, "bilder": bilder_}
+
+    def leeren(self):
+        with self._lock:
+            self._bloecke.clear()
+
+    def holen(self, layout, item):
+        key = report_key(layout, [item[k] for k in LAYOUTS[layout][1]])
+        with self._lock:
+            if key in self._bloecke:
+                self._bloecke.move_to_end(key)
+                return self._bloecke[key]
+        block = self._rendern(layout, item)
+        with self._lock:
+            self._bloecke[key] = block
+            while len(self._bloecke) > self.max_bloecke:
+                self._bloecke.popitem(last=False)
+        return block
+
+    def einsetzen(self, pdf, layout, item):
+        block = self.holen(layout, item)
+        y = pdf.get_y()
+        if block is None or y + block["hoehe"] > pdf.page_break_trigger:
+            LAYOUTS[layout][0](pdf, item)  # passt nicht am Stück: normal zeichnen, fpdf bricht selbst um
+            return
+        # Schriften und Bilder im Zieldokument anmelden, lokale Nummern im Stream umschreiben
+        fonts = {}
+        for i, fontkey in block["fonts"].items():
+            if fontkey not in pdf.fonts:
+                familie = next(f for f in _FAMILIEN if fontkey.startswith(f))
+                pdf.set_font(familie, fontkey[len(familie):])
+            fonts[str(i)] = pdf.fonts[fontkey]['i']
+        bilder_ = {}
+        for i, info in block["bilder"].items():
+            datei = pdf.kanonisch(info['datei'])
+            if datei not in pdf.images:
+                pdf.images[datei] = dict(info, i=len(pdf.images) + 1, datei=datei)
+            bilder_[str(i)] = pdf.images[datei]['i']
+        stream = _FONT.sub(lambda m: f"BT /F{fonts[m.group(1)]} ", block["stream"])
+        stream = _BILD.sub(lambda m: f" cm /I{bilder_[m.group(1)]} Do Q", stream)
+        pdf._out(f"q 1 0 0 1 0 {(block['y0'] - y) * pdf.k:.2f} cm\n{stream}Q")
+        pdf.set_xy(pdf.l_margin, y + block["hoehe"])
+
+
+bloecke = BlockCache(BLOECKE_MAX)
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-block")
+
+
+def vorbereiten(item, layout="bericht", modus=MODUS):
+    # Direkt nach dem Speichern: Block im Hintergrund rendern (wartet dort auch auf laufende Foto-Jobs)
+    _pool.submit(messung.im_kontext(lambda: bloecke.holen(layout, _druckfertig(_mit_pfaden([item]), modus)[0])))
+
+
+# --- CACHE ---
+class PdfCache:
+    # LRU über fertige PDF-Bytes, begrenzt nach Gesamtgröße; optional zusätzlich auf Platte.
+    # Die Platte begrenzt spool_aufraeumen (disk_dir ist SPOOL_DIR), max_bytes gilt nur für den RAM.
+    def __init__(self, max_bytes, disk_dir=""):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._mem = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _disk_pfad(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+        if self.disk_dir and os.path.exists(self._disk_pfad(key)):
+            with open(self._disk_pfad(key), "rb") as fh:
+                data = fh.read()
+            os.utime(self._disk_pfad(key))  # zuletzt gebraucht -> wird als letztes verdrängt
+            self._merken(key, data)
+            return data
+        return None
+
+    def put(self, key, data):
+        self._merken(key, data)
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp = f"{self._disk_pfad(key)}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, self._disk_pfad(key))
+
+    def _merken(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._mem:
+                self._size -= len(self._mem.pop(key))
+            self._mem[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, alt = self._mem.popitem(last=False)
+                self._size -= len(alt)
+
+    def get_or_render(self, key, render):
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+
+cache = PdfCache(CACHE_MB * 1024 * 1024, CACHE_DIR)
+
+
+def _mit_pfaden(eintraege):
+    # Laufende Foto-Jobs auflösen, damit Schlüssel und PDF nur fertige Pfade sehen
+    return [dict(item, Fotos=bilder.pfade(item['Fotos'], timeout=30)) for item in eintraege]
+
+
+def _druckfertig(eintraege, modus=MODUS):
+    dpi, qualitaet = MODI[modus]
+    return [dict(item, Fotos=[bilder.druckversion(p, dpi=dpi, qualitaet=qualitaet) for p in item['Fotos']])
+            for item in eintraege]
+
+
+def _rendern(key, n, seiten, art, modus):
+    # Kleine Berichte als Bytes aus dem RAM-Cache, große direkt in eine Datei (Speicher bleibt flach)
+    if n < STREAM_AB:
+        def render():
+            t0 = time.perf_counter()
+            with messung.span("pdf_bauen"):
+                pdf = DateiPDF()  # Bilddaten erst beim Schreiben laden
+                seiten(pdf)
+                data = pdf.output(dest='S').encode('latin-1', 'replace')
+            speicher.pdf_protokollieren(art, modus, n, len(data), (time.perf_counter() - t0) * 1000)
+            return data
+        return cache.get_or_render(key, render)
+    return pathlib.Path(_datei(key, n, seiten, art, modus)).read_bytes  # st.download_button liest die Datei erst beim Klick
+
+
+def _datei(key, n, seiten, art, modus):
+    ziel = os.path.join(SPOOL_DIR, f"{key}.pdf")
+    if os.path.exists(ziel):
+        os.utime(ziel)  # mtime = letzte Nutzung, danach richtet sich spool_aufraeumen
+    else:
+        t0 = time.perf_counter()
+        with messung.span("pdf_bauen"):
+            pdf = DateiPDF()
+            seiten(pdf)
+            pdf.schreiben(ziel)
+        speicher.pdf_protokollieren(art, modus, n, os.path.getsize(ziel), (time.perf_counter() - t0) * 1000)
+    return ziel
+
+
+def spool_aufraeumen(max_mb=SPOOL_MB):
+    # Läuft mit dem Foto-Aufräumen: liegengebliebene Temp-Dateien weg, dann über max_mb die am längsten
+    # nicht gebrauchten PDFs zuerst; jüngere als bilder.KARENZ_S bleiben (Download kann noch anstehen)
+    if not os.path.isdir(SPOOL_DIR):
+        return 0
+    grenze = time.time() - bilder.KARENZ_S
+    dateien = sorted((e for e in os.scandir(SPOOL_DIR) if e.is_file()), key=lambda e: e.stat().st_mtime)
+    zip_grenze = time.time() - EXPORT_STUNDEN * 3600
+    weg = [e for e in dateien if e.name.endswith(".tmp") and e.stat().st_mtime < grenze
+           or e.name.endswith(".zip") and e.stat().st_mtime < zip_grenze]  # Export-ZIPs verfallen
+    n = sum(bilder._loeschen(e.path) for e in weg)
+    dateien = [e for e in dateien if e not in weg and not e.name.endswith(".tmp")]
+    zu_viel = sum(e.stat().st_size for e in dateien) - max_mb * 1024 * 1024
+    for e in dateien:
+        if not max_mb or zu_viel <= 0 or e.stat().st_mtime >= grenze:
+            break
+        if bilder._loeschen(e.path):
+            zu_viel -= e.stat().st_size
+            n += 1
+    return n
+
+
+bilder.weitere["spool_geloescht"] = spool_aufraeumen
+
+
+def report_key(*teile):
+    # Fotos sind per Inhalts-Hash benannt, der Pfad steht also für den Bildinhalt
+    raw = json.dumps(teile, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def bericht_laden(kopf, eintraege, modus=MODUS, fortschritt=None):
+    # Bytes oder Lese-Funktion für die PDF-Datei -- beides nimmt st.download_button direkt
+    eintraege = _mit_pfaden(eintraege)
+    key = report_key("bericht", modus, kopf, eintraege)
+    return _rendern(key, len(eintraege), lambda pdf: bericht_seiten(pdf, kopf, _druckfertig(eintraege, modus), fortschritt),
+                    "bericht", modus)
+
+
+def archiv_laden(rep, modus=MODUS, fortschritt=None):
+    rep = dict(rep, Details=_mit_pfaden(rep["Details"]))
+    key = report_key("archiv", modus, rep)
+    return _rendern(key, len(rep["Details"]),
+                    lambda pdf: archiv_seiten(pdf, dict(rep, Details=_druckfertig(rep["Details"], modus)), fortschritt),
+                    "archiv", modus)
+
+
+# --- SAMMEL-EXPORT (mehrere Archivberichte als ein ZIP, gerendert in eigenen Prozessen) ---
+_prozesse = None
+_prozesse_lock = threading.Lock()
+
+
+def _prozess_pool():
+    # Erst beim ersten Export starten und dann behalten; "spawn", weil fork mit den Threads des Servers unsicher ist
+    global _prozesse
+    with _prozesse_lock:
+        if _prozesse is None:
+            _prozesse = ProcessPoolExecutor(max_workers=EXPORT_PROZESSE, mp_context=multiprocessing.get_context("spawn"))
+        return _prozesse
+
+
+def _archiv_datei(key, rep, modus):
+    # Läuft im Export-Prozess; rep enthält nur dicts (Katalog-Codes gelten nur im eigenen Prozess)
+    return _datei(key, len(rep["Details"]),
+                  lambda pdf: archiv_seiten(pdf, dict(rep, Details=_druckfertig(rep["Details"], modus))), "archiv", modus)
+
+
+def _zip_name(rep):
+    # "Kunde/2024-03-01 Halle 4 #17.pdf" -- sortiert nach Datum, die ID hält gleiche Tage auseinander
+    sauber = lambda t: re.sub(r'[\\/:*?"<>|]', "_", str(t or "")).strip()
+    datum = "-".join(reversed(rep["Datum"].split(".")))
+    titel = " ".join(t for t in (datum, sauber(rep.get("Bereich")), f"#{rep['id']}") if t)
+    return f"{sauber(rep['Kunde']) or 'Ohne Kunde'}/{titel}.pdf"
+
+
+def stapel_laden(bericht_ids, modus=MODUS, fortschritt=None):
+    # Fertige PDFs (Cache, Spool) kommen direkt ins ZIP, der Rest wird auf EXPORT_PROZESSE Prozesse verteilt
+    # und eingepackt, sobald er fertig ist -- im RAM liegt dabei nie mehr als ein PDF
+    berichte = []
+    for bid in bericht_ids:
+        rep = speicher.bericht(bid)
+        rep = dict(rep, Details=_mit_pfaden(rep["Details"]))
+        berichte.append((report_key("archiv", modus, rep), rep))
+    ziel = os.path.join(SPOOL_DIR, f"{report_key('stapel', [k for k, _ in berichte])}.zip")
+    if not os.path.exists(ziel):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        tmp = f"{ziel}.{os.getpid()}.{threading.get_ident()}.tmp"
+        erledigt, offen = 0, {}
+        try:
+            # ZIP_STORED: Seiten sind schon zlib-komprimiert, Fotos JPEG -- Deflate kostet nur Zeit
+            with messung.span("pdf_stapel"), zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+                for key, rep in berichte:
+                    data, datei = cache.get(key), os.path.join(SPOOL_DIR, f"{key}.pdf")
+                    if data is not None:
+                        zf.writestr(_zip_name(rep), data)
+                    elif os.path.exists(datei):
+                        os.utime(datei)
+                        zf.write(datei, _zip_name(rep))
+                    else:
+                        offen[_prozess_pool().submit(_archiv_datei, key, rep, modus)] = (key, rep)
+                        continue
+                    erledigt += 1
+                    if fortschritt:
+                        fortschritt(erledigt, len(berichte))
+                for f in as_completed(offen):
+                    key, rep = offen.pop(f)
+                    datei = f.result()
+                    zf.write(datei, _zip_name(rep))
+                    if len(rep["Details"]) < STREAM_AB:
+                        cache.put(key, pathlib.Path(datei).read_bytes())  # Einzel-Download findet ihn dann auch
+                    erledigt += 1
+                    if fortschritt:
+                        fortschritt(erledigt, len(berichte))
+            os.replace(tmp, ziel)
+        except BaseException:
+            for f in offen:
+                f.cancel()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    else:
+        os.utime(ziel)  # Verfall (EXPORT_STUNDEN) zählt ab der letzten Anfrage
+    return pathlib.Path(ziel).read_bytes
@@ -0,0 +1,188 @@
+import glob
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageOps
+import messung
+import speicher
+
+# --- KONFIGURATION (über Umgebungsvariablen anpassbar) ---
+FOTO_DIR = os.environ.get("REGAL_FOTO_DIR", "fotos")
+MAX_KANTE = int(os.environ.get("REGAL_FOTO_MAX_KANTE", "1600"))
+JPEG_QUALITAET = int(os.environ.get("REGAL_FOTO_QUALITAET", "82"))
+THUMB_KANTE = int(os.environ.get("REGAL_THUMB_KANTE", "320"))
+THUMB_QUALITAET = 70
+DRUCK_DPI = int(os.environ.get("REGAL_DRUCK_DPI", "200"))
+WORKER = int(os.environ.get("REGAL_FOTO_WORKER", "2"))
+QUOTA_MB = int(os.environ.get("REGAL_FOTO_QUOTA_MB", "2048"))  # Obergrenze für FOTO_DIR, 0 = keine
+AUFRAEUMEN_S = int(os.environ.get("REGAL_FOTO_AUFRAEUMEN", "3600"))  # Sekunden zwischen zwei Läufen, 0 = nie
+KARENZ_S = 600  # jüngere Dateien bleiben (Foto-Job läuft noch / PDF wird gerade gebaut)
+
+# Ein Pool pro Server-Prozess; das Modul wird von Streamlit nur einmal importiert
+_pool = ThreadPoolExecutor(max_workers=WORKER, thread_name_prefix="foto")
+
+
+def _speichern(img, path, quality):
+    # Erst in eine Temp-Datei schreiben, dann umbenennen -> nie halbe Dateien auf Platte
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    img.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp, path)
+
+
+def thumb_pfad(path):
+    return os.path.join(os.path.dirname(path), "thumbs", os.path.basename(path))
+
+
+def druckversion(path, breite_mm=45, dpi=DRUCK_DPI, qualitaet=JPEG_QUALITAET):
+    # Auf Druckbreite im PDF vorskaliertes JPEG (wird einmal erzeugt und wiederverwendet)
+    px = round(breite_mm / 25.4 * dpi)
+    ordner = f"druck{px}" if qualitaet == JPEG_QUALITAET else f"druck{px}q{qualitaet}"
+    ziel = os.path.join(os.path.dirname(path), ordner, os.path.basename(path))
+    if os.path.exists(ziel):
+        os.utime(ziel)  # mtime = letzte Nutzung, danach richtet sich die Verdrängung
+        return ziel
+    with messung.span("foto_druckversion"), Image.open(path) as img:
+        img.draft("RGB", (px, px))
+        img = img.convert("RGB")
+        if img.width > px:
+            img = img.resize((px, round(img.height * px / img.width)), Image.LANCZOS)
+        _speichern(img, ziel, qualitaet)
+    return ziel
+
+
+def ingest(f):
+    # Kamera-Upload -> verkleinertes JPEG + Thumbnail, abgelegt unter dem Inhalts-Hash
+    data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+    key = hashlib.sha256(data).hexdigest()[:32]
+    path = os.path.join(FOTO_DIR, f"{key}.jpg")
+    if os.path.exists(path):
+        os.utime(path)  # frisch halten, damit das Aufräumen es nicht gerade jetzt löscht
+        return path  # gleiches Foto schon gespeichert
+
+    with messung.span("foto_dekodieren"):
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (MAX_KANTE, MAX_KANTE))  # JPEG direkt verkleinert dekodieren
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((MAX_KANTE, MAX_KANTE), Image.LANCZOS)
+    with messung.span("foto_kodieren"):
+        _speichern(img, path, JPEG_QUALITAET)
+        img.thumbnail((THUMB_KANTE, THUMB_KANTE), Image.LANCZOS)
+        _speichern(img, thumb_pfad(path), THUMB_QUALITAET)
+    return path
+
+
+def ingest_async(f):
+    # Bytes sofort lesen (der Upload gehört zum Skriptlauf), kodiert wird im Hintergrund
+    with messung.span("foto_annehmen"):
+        data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+        return _pool.submit(messung.im_kontext(ingest), io.BytesIO(data))
+
+
+def ausstehend(fotos):
+    # Eigene Jobs als Future, aus der Datenbank geladene (andere Sitzung) als Platzhalter-Pfad
+    return sum(1 for f in fotos if (not f.done() if isinstance(f, Future) else f.startswith(speicher.AUSSTEHEND)))
+
+
+def pfade(fotos, timeout=None):
+    # Fertige Foto-Pfade; laufende Jobs bis timeout abwarten, sonst (oder bei Fehler) überspringen
+    out = []
+    for f in fotos:
+        if isinstance(f, Future):
+            try:
+                f = f.result(timeout=timeout)
+            except Exception:
+                continue
+        if os.path.exists(f):
+            out.append(f)
+    return out
+
+
+# --- LEBENSZYKLUS ---
+# Originale liegen direkt in FOTO_DIR, abgeleitete Dateien (thumbs/, druck*/) in Unterordnern unter gleichem Namen
+letzter_lauf = None  # Ergebnis des letzten Aufräumens (für Fehlersuche; Quote gesprengt / Fehler gehen ins Log)
+weitere = {}  # Name -> Funktion, die beim Aufräumen mitläuft und die Anzahl gelöschter Dateien liefert (z.B. PDF-Spool)
+
+
+def _loeschen(pfad):
+    try:
+        os.remove(pfad)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _bestand():
+    originale, abgeleitet, tmp = {}, [], []
+    if not os.path.isdir(FOTO_DIR):
+        return originale, abgeleitet, tmp
+    for e in os.scandir(FOTO_DIR):
+        if e.is_dir():
+            for d in os.scandir(e.path):
+                (tmp if d.name.endswith(".tmp") else abgeleitet).append(d)
+        elif e.name.endswith(".tmp"):
+            tmp.append(e)
+        else:
+            originale[e.name] = e
+    return originale, abgeleitet, tmp
+
+
+def aufraeumen():
+    # Originale ohne Eintrag (Entwurf oder Archiv), deren Ableitungen und liegengebliebene Temp-Dateien löschen
+    ref = speicher.foto_pfade()
+    ref_namen = {os.path.basename(p) for p in ref}
+    grenze = time.time() - KARENZ_S
+    originale, abgeleitet, tmp = _bestand()
+    weg = {n for n, e in originale.items() if n not in ref_namen and e.stat().st_mtime < grenze}
+    n = sum(_loeschen(originale[name].path) for name in weg)
+    n += sum(_loeschen(d.path) for d in abgeleitet if d.name in weg or d.name not in originale)
+    n += sum(_loeschen(t.path) for t in tmp if t.stat().st_mtime < grenze)
+    # Altlasten der ersten Version (temp_*.jpg / img_*.jpg im Arbeitsverzeichnis)
+    for pfad in glob.glob("temp_*.jpg") + glob.glob("img_*.jpg"):
+        if pfad not in ref and os.path.getmtime(pfad) < grenze:
+            n += _loeschen(pfad)
+    return n
+
+
+def quota_einhalten(quota_mb=QUOTA_MB):
+    # Über der Quote: abgeleitete Dateien, die am längsten nicht gebraucht wurden, zuerst; Originale nie
+    originale, abgeleitet, _ = _bestand()
+    zu_viel = sum(e.stat().st_size for e in list(originale.values()) + abgeleitet) - quota_mb * 1024 * 1024
+    grenze = time.time() - KARENZ_S
+    n = 0
+    for d in sorted(abgeleitet, key=lambda d: d.stat().st_mtime):
+        if zu_viel <= 0 or d.stat().st_mtime >= grenze:
+            break
+        if _loeschen(d.path):
+            zu_viel -= d.stat().st_size
+            n += 1
+    return n, max(zu_viel, 0)
+
+
+def _hausmeister():
+    global letzter_lauf
+    while True:
+        time.sleep(AUFRAEUMEN_S)
+        try:
+            with messung.span("foto_aufraeumen"):
+                geloescht = aufraeumen()
+                verdraengt, rest = quota_einhalten() if QUOTA_MB else (0, 0)
+                andere = {name: fn() for name, fn in list(weitere.items())}
+            letzter_lauf = {"zeit": time.time(), "geloescht": geloescht, "verdraengt": verdraengt,
+                            "ueber_quota_mb": round(rest / 1024 / 1024, 1), **andere}  # > 0: Originale allein sprengen die Quote
+            if rest > 0:
+                logging.getLogger(__name__).warning(
+                    "Foto-Quote %d MB: Originale allein liegen %.1f MB darüber (REGAL_FOTO_QUOTA_MB erhöhen oder Archiv auslagern)",
+                    QUOTA_MB, letzter_lauf["ueber_quota_mb"])
+        except Exception as e:
+            letzter_lauf = {"zeit": time.time(), "fehler": repr(e)}
+            logging.getLogger(__name__).exception("Foto-Aufräumen fehlgeschlagen")
+
+
+if AUFRAEUMEN_S > 0:
+    threading.Thread(target=_hausmeister, name="foto-hausmeister", daemon=True).start()
@@ -0,0 +1,120 @@
+import threading
+from collections.abc import MutableMapping
+
+
+# --- KATALOGE (Auswahllisten als Code-Tabellen) ---
+class Katalog:
+    # Code = Position in der Liste; Vorauswahl per dict statt list.index.
+    # Unbekannte Werte (Altdaten, Import) bekommen beim ersten Auftreten einen neuen Code hinten dran.
+    __slots__ = ("optionen", "werte", "codes", "_lock")
+
+    def __init__(self, optionen):
+        self.optionen = list(optionen)  # was die Formulare anbieten
+        self.werte = list(optionen)
+        self.codes = {w: i for i, w in enumerate(optionen)}
+        self._lock = threading.Lock()
+
+    def code(self, wert):
+        c = self.codes.get(wert)
+        if c is None:
+            with self._lock:
+                c = self.codes.get(wert)
+                if c is None:
+                    c = len(self.werte)
+                    self.werte.append(wert)  # erst der Wert, dann der Code -> Leser sehen nie einen Code ohne Wert
+                    self.codes[wert] = c
+        return c
+
+    def index(self, code):
+        # Vorauswahl im Formular; Altwerte außerhalb der Liste -> erste Option
+        return code if code is not None and code < len(self.optionen) else 0
+
+
+TYPEN = Katalog(["Palettenregal", "Fachbodenregal", "Kragarmregal", "Durchlaufregal", "Sonstiges"])
+BAUTEILE = Katalog(["Stütze", "Traverse", "Rammschutz", "Aussteifung"])
+STUFEN = Katalog(["Grün", "Gelb", "ROT"])
+MAENGEL = Katalog(["Stapleranprall", "Sicherungsstift fehlt", "Bodenanker lose", "Überladung", "Verformung", "Sonstiges"])
+MASSNAHMEN = Katalog(["Beobachten", "Tausch binnen 4 Wo.", "SOFORT SPERREN", "Stift ersetzen", "Anker nachziehen"])
+
+# Schlüssel (wie im alten dict) -> (Attribut, Katalog oder None für Klartext); "Mangel" ist zusammengesetzt
+_FELDER = {
+    "Regal": ("regal", None), "Typ": ("typ", TYPEN), "Bauteil": ("bauteil", BAUTEILE), "Position": ("position", None),
+    "Stufe": ("stufe", STUFEN), "Massnahme": ("massnahme", MASSNAHMEN), "Fotos": ("fotos", None),
+}
+_OPTIONAL = {"_id": "id", "_von": "von"}  # nur vorhanden, wenn gesetzt (wie früher "_id" in item)
+
+
+def mangel_teilen(text):
+    # "Stapleranprall: Delle > 3mm" -> ("Stapleranprall", "Delle > 3mm")
+    mangel, _, kommentar = (text or "").partition(":")
+    return mangel.strip(), kommentar.strip()
+
+
+# --- EINTRAG ---
+class Eintrag(MutableMapping):
+    # Ein Mangel; Auswahlfelder als Codes, Kommentar getrennt vom Hauptmangel.
+    # Liest und schreibt sich wie das alte dict (e["Stufe"], e.get("_id"), dict(e)) -- bei einem Bruchteil des Speichers.
+    __slots__ = ("id", "regal", "typ", "bauteil", "position", "stufe", "mangel", "kommentar", "massnahme", "fotos", "von")
+
+    def __init__(self, regal="", typ="Palettenregal", bauteil="Stütze", position="", stufe="Grün",
+                 mangel="Stapleranprall", kommentar="", massnahme="Beobachten", fotos=(), id=None, von=None):
+        self.id, self.von = id, von
+        self.regal, self.position, self.kommentar = regal, position, kommentar
+        self.typ = None if typ is None else TYPEN.code(typ)  # app.py.py fragt keinen Typ ab -> bleibt leer (NULL)
+        self.bauteil, self.stufe = BAUTEILE.code(bauteil), STUFEN.code(stufe)
+        self.mangel, self.massnahme = MAENGEL.code(mangel), MASSNAHMEN.code(massnahme)
+        self.fotos = tuple(fotos)  # leer: das eine () aller Einträge
+
+    def kopie(self, **felder):
+        neu = Eintrag.__new__(Eintrag)
+        for a in Eintrag.__slots__:
+            setattr(neu, a, getattr(self, a))
+        neu.update(felder)
+        return neu
+
+    @property
+    def mangel_text(self):
+        return f"{MAENGEL.werte[self.mangel]}: {self.kommentar}"
+
+    # --- dict-Schnittstelle ---
+    def __getitem__(self, k):
+        if k == "Mangel":
+            return self.mangel_text
+        if k in _FELDER:
+            attr, katalog = _FELDER[k]
+            wert = getattr(self, attr)
+            return katalog.werte[wert] if katalog and wert is not None else wert
+        if k in _OPTIONAL and getattr(self, _OPTIONAL[k]) is not None:
+            return getattr(self, _OPTIONAL[k])
+        raise KeyError(k)
+
+    def __setitem__(self, k, wert):
+        if k == "Mangel":
+            mangel, self.kommentar = mangel_teilen(wert)
+            self.mangel = MAENGEL.code(mangel)
+        elif k == "Fotos":
+            self.fotos = tuple(wert)
+        elif k in _FELDER:
+            attr, katalog = _FELDER[k]
+            setattr(self, attr, katalog.code(wert) if katalog and wert is not None else wert)
+        elif k in _OPTIONAL:
+            setattr(self, _OPTIONAL[k], wert)
+        else:
+            raise KeyError(k)
+
+    def __delitem__(self, k):
+        if k not in _OPTIONAL:
+            raise KeyError(k)
+        setattr(self, _OPTIONAL[k], None)
+
+    def __iter__(self):
+        yield from ("Regal", "Typ", "Bauteil", "Position", "Stufe", "Mangel", "Massnahme", "Fotos")
+        for k, attr in _OPTIONAL.items():
+            if getattr(self, attr) is not None:
+                yield k
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Eintrag({dict(self)!r})"
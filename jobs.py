@@ -0,0 +1,103 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import messung
+
+# --- KONFIGURATION ---
+WORKER = int(os.environ.get("REGAL_PDF_WORKER", "2"))
+MAX_JOBS = 200  # so viele Jobs (inkl. fertige) werden zum Abholen aufgehoben
+ERGEBNIS_MB = int(os.environ.get("REGAL_JOB_ERGEBNIS_MB", "64"))  # fertige PDF-Bytes, die auf Abholung warten
+
+# Gemeinsame Warteschlange für alle Sitzungen des Server-Prozesses
+_pool = ThreadPoolExecutor(max_workers=WORKER, thread_name_prefix="pdf")
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, titel, einheit="Einträge"):
+        self.id = uuid.uuid4().hex
+        self.titel = titel
+        self.einheit = einheit
+        self.erledigt = 0
+        self.gesamt = 0
+        self.ergebnis = None
+        self.fehler = None
+        self.verfallen = False
+        self.future = None
+
+    def fortschritt(self, erledigt, gesamt):
+        self.erledigt, self.gesamt = erledigt, gesamt
+
+    @property
+    def fertig(self):
+        return self.future.done()
+
+    @property
+    def anteil(self):
+        return self.erledigt / self.gesamt if self.gesamt else 0.0
+
+    def _lauf(self, fn, args):
+        try:
+            self.ergebnis = fn(*args, fortschritt=self.fortschritt)
+        except Exception as e:
+            self.fehler = e
+        _begrenzen(self)
+
+
+def _begrenzen(neu):
+    # Bytes-Ergebnisse liegen außerhalb des PdfCache: über ERGEBNIS_MB die ältesten verwerfen (Lese-Funktionen kosten nichts)
+    groesse = len(neu.ergebnis) if isinstance(neu.ergebnis, bytes) else 0
+    with _lock:
+        for job in reversed(_jobs.values()):
+            if job is neu or not isinstance(job.ergebnis, bytes):
+                continue
+            groesse += len(job.ergebnis)
+            if groesse > ERGEBNIS_MB * 1024 * 1024:
+                job.ergebnis, job.verfallen = None, True
+
+
+def starten(titel, fn, *args, einheit="Einträge"):
+    # fn bekommt zusätzlich fortschritt=(erledigt, gesamt) und läuft im Worker-Pool
+    job = Job(titel, einheit)
+    job.future = _pool.submit(messung.im_kontext(job._lauf), fn, args)
+    with _lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            alt_id = next((k for k, j in _jobs.items() if j.fertig), None)
+            if alt_id is None:
+                break
+            del _jobs[alt_id]
+    return job.id
+
+
+def holen(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+# --- ANZEIGE ---
+@st.fragment(run_every=1)
+def _fortschritt(job_id):
+    # Pollt nur dieses Fragment; wenn der Job fertig ist, einmal die ganze Seite neu laden
+    job = holen(job_id)
+    if job is None or job.fertig:
+        st.rerun()
+    st.progress(job.anteil, text=f"⏳ {job.titel}: {job.erledigt}/{job.gesamt or '?'} {job.einheit}")
+
+
+def anzeigen(job_id, label, file_name, key):
+    job = holen(job_id)
+    if job is None:
+        return
+    if not job.fertig:
+        _fortschritt(job_id)
+    elif job.fehler:
+        st.error(f"{job.titel} konnte nicht erstellt werden: {job.fehler}")
+    elif job.verfallen:
+        st.info(f"{job.titel}: Download abgelaufen, bitte neu erstellen.")
+    else:
+        st.download_button(label, data=job.ergebnis, file_name=file_name, key=key)
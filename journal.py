@@ -0,0 +1,165 @@
+import csv
+import logging
+import os
+import random
+import threading
+import time
+import pandas as pd
+import messung
+import speicher
+
+# --- KONFIGURATION ---
+INTERVALL = int(os.environ.get("REGAL_SYNC_INTERVALL", "10"))  # Sekunden zwischen zwei Uploads
+BATCH = int(os.environ.get("REGAL_SYNC_BATCH", "200"))  # Zeilen pro Anfrage und Blatt
+MAX_WARTEN = 300  # längste Pause nach wiederholten Fehlern
+FAKE_DIR = os.environ.get("REGAL_SYNC_FAKE_DIR", "")  # lokales Ersatz-Sheet (CSV je Blatt) für Tests / offline
+FAKE_FEHLER = float(os.environ.get("REGAL_SYNC_FAKE_FEHLER", "0"))  # Anteil absichtlich fehlschlagender Anfragen
+
+# Blatt -> (Journal-Arten, Spaltenköpfe, Zeile aus Journal-Eintrag)
+BLAETTER = {
+    "Eintraege": (("eintrag", "geloescht"),
+                  ["Journal", "Zeit", "Aktion", "Bericht", "Eintrag", "Regal", "Typ", "Bauteil", "Position",
+                   "Stufe", "Mangel", "Massnahme", "Pruefer-Sitzung"],
+                  lambda jid, zeit, art, d: [jid, zeit, "gespeichert" if art == "eintrag" else "geloescht",
+                                             d.get("bericht"), d["id"], d.get("Regal"), d.get("Typ"),
+                                             d.get("Bauteil"), d.get("Position"), d.get("Stufe"), d.get("Mangel"),
+                                             d.get("Massnahme"), d.get("von")]),
+    "Berichte": (("bericht",),
+                 ["Journal", "Zeit", "Bericht", "Kunde", "Datum", "Standort", "Bereich", "Eintraege"],
+                 lambda jid, zeit, art, d: [jid, zeit, d["bericht"], d["Kunde"], d["Datum"], d["Standort"],
+                                            d["Bereich"], d["Eintraege"]]),
+}
+
+
+# --- ZIELE ---
+class SheetZiel:
+    # Google Sheet über st-gsheets-connection; mit gspread ein append_rows pro Blatt und Batch
+    name = "sheets"
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._gewarnt = False
+
+    def _blatt(self, blatt, kopf):
+        oeffnen = getattr(getattr(self.conn, "_instance", None), "_open_spreadsheet", None)
+        if oeffnen is None:
+            return None
+        sheet = oeffnen()
+        try:
+            return sheet.worksheet(blatt)
+        except Exception:
+            ws = sheet.add_worksheet(blatt, rows=1, cols=len(kopf))
+            ws.append_row(kopf)
+            return ws
+
+    def anhaengen(self, blatt, kopf, zeilen):
+        ws = self._blatt(blatt, kopf)
+        if ws is not None:
+            ws.append_rows(zeilen, value_input_option="RAW")
+            return
+        # Ohne gspread-Zugriff: lesen + einmal komplett schreiben (zwei Anfragen pro Batch, das ganze Blatt jedes Mal)
+        if not self._gewarnt:
+            logging.getLogger(__name__).warning(
+                "st-gsheets-connection ohne _open_spreadsheet: Sheets-Sync lädt je Batch das ganze Blatt neu hoch")
+            self._gewarnt = True
+        alt = self.conn.read(worksheet=blatt, ttl=0)
+        self.conn.update(worksheet=blatt, data=pd.concat([alt, pd.DataFrame(zeilen, columns=kopf)], ignore_index=True))
+
+
+class CsvZiel:
+    # Ersatz-Sheet: eine CSV pro Blatt; fehlerquote > 0 simuliert eine wackelige Verbindung
+    name = "fake"
+
+    def __init__(self, verzeichnis, fehlerquote=0.0):
+        self.verzeichnis = verzeichnis
+        self.fehlerquote = fehlerquote
+        self.anfragen = 0
+
+    def anhaengen(self, blatt, kopf, zeilen):
+        self.anfragen += 1
+        if random.random() < self.fehlerquote:
+            raise ConnectionError("Fake-Sheet: keine Verbindung")
+        os.makedirs(self.verzeichnis, exist_ok=True)
+        pfad = os.path.join(self.verzeichnis, f"{blatt}.csv")
+        neu = not os.path.exists(pfad)
+        with open(pfad, "a", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            if neu:
+                w.writerow(kopf)
+            w.writerows(zeilen)
+
+
+# --- SYNC ---
+class Sync:
+    # Lädt das Journal im Hintergrund hoch; die App schreibt nur lokal und wartet nie auf das Netz
+    def __init__(self, ziel, intervall=INTERVALL):
+        self.ziel = ziel
+        self.intervall = intervall
+        self.fehler = None
+        self.fehlversuche = 0
+        self.gesendet = 0
+        self.stand = None  # Zeitpunkt des letzten erfolgreichen Uploads
+        self._aus = False
+        self._wecker = threading.Event()
+        threading.Thread(target=self._schleife, name="journal-sync", daemon=True).start()
+
+    def _schluessel(self, blatt):
+        return f"{self.ziel.name}:{blatt}"
+
+    def senden(self):
+        # Ein Batch je Blatt; True, solange noch mehr wartet
+        mehr = False
+        for blatt, (arten, kopf, zeile) in BLAETTER.items():
+            eintraege = speicher.journal_lesen(speicher.journal_stand(self._schluessel(blatt)), arten, BATCH)
+            if not eintraege:
+                continue
+            with messung.span("sheets_schreiben"):
+                self.ziel.anhaengen(blatt, kopf, [zeile(*e) for e in eintraege])
+            # Erst nach erfolgreichem Upload quittieren; bricht es dazwischen ab, steht die Journal-Nr doppelt im Sheet
+            speicher.journal_quittieren(self._schluessel(blatt), eintraege[-1][0])
+            self.gesendet += len(eintraege)
+            self.fehlversuche = 0  # Backoff zählt nur Fehler in Folge, sonst wächst er über einen langen Rückstand
+            mehr = mehr or len(eintraege) == BATCH
+        return mehr
+
+    def offen(self):
+        return sum(speicher.journal_offen(speicher.journal_stand(self._schluessel(blatt)), arten)
+                   for blatt, (arten, _, _) in BLAETTER.items())
+
+    def anstossen(self):
+        self._wecker.set()
+
+    def stoppen(self):
+        # Für Tests/Benchmark; der Server-Worker läuft bis zum Prozessende
+        self._aus = True
+        self._wecker.set()
+
+    def _schleife(self):
+        while not self._aus:
+            try:
+                while self.senden():
+                    pass
+                self.fehler, self.fehlversuche, self.stand = None, 0, time.time()
+                warten = self.intervall
+            except Exception as e:
+                # Exponentiell länger warten (mit Zufall, damit nicht alle Server gleichzeitig wiederkommen)
+                self.fehler, self.fehlversuche = e, self.fehlversuche + 1
+                warten = min(MAX_WARTEN, self.intervall * 2 ** self.fehlversuche) * random.uniform(0.5, 1)
+            self._wecker.wait(warten)
+            self._wecker.clear()
+
+
+_sync = None
+_sync_lock = threading.Lock()
+
+
+def sync(conn=None):
+    # Ein Sync-Worker pro Server-Prozess; ohne Ziel (kein Sheet, kein Fake) bleibt es beim lokalen Journal
+    global _sync
+    with _sync_lock:
+        if _sync is None:
+            if FAKE_DIR:
+                _sync = Sync(CsvZiel(FAKE_DIR, FAKE_FEHLER))
+            elif conn is not None:
+                _sync = Sync(SheetZiel(conn))
+        return _sync
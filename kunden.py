@@ -0,0 +1,129 @@
+import bisect
+import difflib
+import os
+from collections import Counter, defaultdict
+import threading
+import time
+import pandas as pd
+import messung
+import speicher
+
+# --- KONFIGURATION ---
+INTERVALL = int(os.environ.get("REGAL_KUNDEN_INTERVALL", "60"))  # Sekunden zwischen zwei Abgleichen
+KUNDEN_CSV = os.environ.get("REGAL_KUNDEN_CSV", "")  # lokaler Ersatz für das Sheet (Tests / offline)
+
+
+# --- QUELLEN ---
+def sheet_quelle(conn):
+    # Google Sheet "Kunden"; ttl=0, der Index cached selbst
+    def laden():
+        with messung.span("sheets_lesen"):
+            df = conn.read(worksheet="Kunden", ttl=0)
+        return df["Kunde"].dropna().astype(str).tolist()
+    return laden
+
+
+def csv_quelle(pfad):
+    # CSV mit Spalte "Kunde"; wird nur neu gelesen, wenn sich die Datei geändert hat
+    stand = {}
+    def laden():
+        mtime = os.path.getmtime(pfad)
+        if stand.get("mtime") != mtime:
+            stand["namen"] = pd.read_csv(pfad)["Kunde"].dropna().astype(str).tolist()
+            stand["mtime"] = mtime
+        return stand["namen"]
+    return laden
+
+
+def _trigramme(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class KundenIndex:
+    # Sortierte Kundenliste im RAM, Stand auf Platte; ein Hintergrund-Thread gleicht mit der Quelle ab
+    def __init__(self, quelle=None, intervall=INTERVALL):
+        self.quelle = quelle
+        self.intervall = intervall
+        self._sheet = set(speicher.sheet_kunden())
+        self._lock = threading.Lock()
+        self.stand = None  # Zeitpunkt des letzten erfolgreichen Abgleichs
+        self.fehler = None
+        self._neu_aufbauen()
+        if quelle is not None:
+            threading.Thread(target=self._schleife, name="kunden-sync", daemon=True).start()
+
+    def _neu_aufbauen(self):
+        namen = sorted(self._sheet | set(speicher.kunden()), key=str.lower)
+        klein = [n.lower() for n in namen]
+        tri = defaultdict(list)  # Trigramm -> Positionen, für die unscharfe Suche
+        for i, k in enumerate(klein):
+            for t in _trigramme(k):
+                tri[t].append(i)
+        # Alles zusammen tauschen, Leser sehen immer einen konsistenten Stand
+        self._daten = (namen, klein, tri)
+
+    def abgleichen(self):
+        namen = set(self.quelle())
+        neu, weg = namen - self._sheet, self._sheet - namen
+        if neu or weg:
+            speicher.sheet_kunden_abgleichen(neu, weg)
+            with self._lock:
+                self._sheet = namen
+                self._neu_aufbauen()
+        self.stand, self.fehler = time.time(), None
+
+    def _schleife(self):
+        while True:
+            try:
+                self.abgleichen()
+            except Exception as e:
+                self.fehler = e  # Sheet langsam/nicht erreichbar: mit dem letzten Stand weiterarbeiten
+            time.sleep(self.intervall)
+
+    def alle(self):
+        return self._daten[0]
+
+    def hinzufuegen(self, name):
+        speicher.kunde_anlegen(name)
+        with self._lock:
+            if name not in self._daten[0]:
+                self._neu_aufbauen()
+
+    def suchen(self, q, limit=200):
+        # Erst Präfix (bisect), dann Teilstring, zuletzt unscharf (Tippfehler)
+        namen, klein, tri = self._daten
+        q = q.strip().lower()
+        if not q:
+            return namen[:limit]
+        i = bisect.bisect_left(klein, q)
+        treffer = []
+        while i < len(klein) and klein[i].startswith(q) and len(treffer) < limit:
+            treffer.append(namen[i])
+            i += 1
+        if len(treffer) < limit:
+            gesehen = set(treffer)
+            treffer += [n for n, k in zip(namen, klein) if q in k and n not in gesehen][:limit - len(treffer)]
+        if not treffer:
+            # Unscharf: Kandidaten mit den meisten gemeinsamen Trigrammen, dann difflib
+            zaehler = Counter(j for t in _trigramme(q) for j in tri.get(t, ()))
+            kandidaten = {klein[j]: namen[j] for j, _ in zaehler.most_common(50)}
+            treffer = [kandidaten[k] for k in difflib.get_close_matches(q, list(kandidaten), n=min(limit, 10), cutoff=0.6)]
+        return treffer
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def index(conn=None):
+    # Ein Index pro Server-Prozess, von allen Sitzungen geteilt
+    global _index
+    with _index_lock:
+        if _index is None:
+            if KUNDEN_CSV:
+                quelle = csv_quelle(KUNDEN_CSV)
+            else:
+                quelle = sheet_quelle(conn) if conn else None
+            _index = KundenIndex(quelle)
+        return _index
@@ -0,0 +1,64 @@
+import hashlib
+import math
+import pandas as pd
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+# --- KONFIGURATION ---
+SEITE = 25  # Einträge pro Seite in der Mängelliste
+
+
+def neu_laden():
+    # Im Fragment-Lauf nur das Fragment neu ausführen; läuft gerade die ganze Seite, eben die ganze Seite
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def filtern(eintraege, stufen=(), bauteile=(), prefix=""):
+    # Indizes (in der Original-Liste) aller Einträge, die zu den Filtern passen
+    prefix = prefix.strip().lower()
+    return [i for i, e in enumerate(eintraege)
+            if (not stufen or e['Stufe'] in stufen)
+            and (not bauteile or e['Bauteil'] in bauteile)
+            and (not prefix or str(e['Regal']).lower().startswith(prefix))]
+
+
+def ansicht(eintraege, bauteil_liste, key):
+    # Filterleiste + Seitenwahl; die Anzahl Widgets bleibt gleich, egal wie lang die Liste ist
+    c_s, c_b, c_r, c_m = st.columns([2, 2, 2, 1])
+    stufen = c_s.multiselect("Stufe", ["Grün", "Gelb", "ROT"], key=f"{key}_stufe")
+    bauteile = c_b.multiselect("Bauteil", bauteil_liste, key=f"{key}_bauteil")
+    prefix = c_r.text_input("Regal beginnt mit", placeholder="z.B. R-0", key=f"{key}_regal")
+    tabelle = c_m.toggle("Tabelle", key=f"{key}_tabelle", help="Mehrere Einträge auf einmal bearbeiten")
+
+    treffer = filtern(eintraege, stufen, bauteile, prefix)
+    seiten = max(1, math.ceil(len(treffer) / SEITE))
+    if st.session_state.get(f"{key}_seite", 1) > seiten:
+        st.session_state[f"{key}_seite"] = seiten
+    if seiten > 1:
+        seite = st.number_input(f"Seite (von {seiten}, {len(treffer)} Einträge)", 1, seiten, key=f"{key}_seite")
+    else:
+        seite = 1
+    return treffer[(seite - 1) * SEITE:seite * SEITE], tabelle
+
+
+def tabelle(eintraege, indizes, optionen, key):
+    # Sammelbearbeitung der sichtbaren Seite in einem Widget; liefert die geänderten Indizes
+    spalten = ["Regal", "Bauteil", "Position", "Stufe", "Mangel"] + [k for k in optionen if k not in ("Bauteil", "Stufe")]
+    # Zeilen und Editor-Key hängen an den Eintrags-IDs: ändert sich die Liste darunter (anderer Prüfer),
+    # beginnt der Editor neu, statt offene Änderungen auf fremde Zeilen zu legen
+    ids = [eintraege[i].get("_id", i) for i in indizes]
+    df = pd.DataFrame([{k: eintraege[i][k] for k in spalten} for i in indizes], index=ids, columns=spalten)
+    conf = {k: st.column_config.SelectboxColumn(k, options=v, required=True) for k, v in optionen.items()}
+    stand = hashlib.sha1(repr(ids).encode()).hexdigest()[:12]
+    neu = st.data_editor(df, key=f"{key}_editor_{stand}", use_container_width=True, num_rows="fixed", column_config=conf)
+    if not st.button("💾 Änderungen übernehmen", key=f"{key}_ok", use_container_width=True):
+        return []
+    geaendert = []
+    for i, row in zip(indizes, neu.to_dict("records")):
+        if any(row[k] != eintraege[i][k] for k in spalten):
+            eintraege[i] = eintraege[i].kopie(**row)
+            geaendert.append(i)
+    return geaendert
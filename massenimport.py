@@ -0,0 +1,82 @@
+import pandas as pd
+import streamlit as st
+import eintrag
+
+# --- KONFIGURATION ---
+PFLICHT = ["Regal", "Bauteil", "Position", "Stufe", "Mangel", "Massnahme"]
+# Alternative Spaltennamen aus Kunden-Exporten
+ALIASE = {"Maßnahme": "Massnahme", "Massn": "Massnahme", "Regal-Nr.": "Regal", "Regal-Nummer": "Regal",
+          "Status": "Stufe", "Hauptmangel": "Mangel", "Zusatz-Info": "Kommentar", "Position / Ebene": "Position"}
+
+
+def lesen(datei):
+    # CSV (Trennzeichen wird erkannt) oder Excel; alles als Text
+    name = getattr(datei, "name", str(datei)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(datei, dtype=str)
+    else:
+        df = pd.read_csv(datei, dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    df = df.rename(columns=lambda c: ALIASE.get(str(c).strip(), str(c).strip()))
+    fehlt = [c for c in PFLICHT if c not in df.columns]
+    if fehlt:
+        raise ValueError(f"Spalten fehlen: {', '.join(fehlt)}")
+    return df
+
+
+def pruefen(df, erlaubt):
+    # Alle Zeilen in einem Durchgang prüfen (spaltenweise, ohne Python-Schleife über Zeilen).
+    # erlaubt: {"Bauteil": [...], "Stufe": [...], "Mangel": [...], "Massnahme": [...]}
+    if df.empty:  # nur Kopfzeile (z.B. leere Vorlage) -- die String-Operationen unten brauchen Zeilen
+        return df.assign(Kommentar=""), pd.DataFrame(columns=["Zeile", *PFLICHT, "Fehler"])
+    df = df.fillna("").apply(lambda s: s.astype(str).str.strip())
+    teile = df["Mangel"].str.split(":", n=1, expand=True).reindex(columns=[0, 1]).fillna("")
+    df["Mangel"] = teile[0].str.strip()
+    kommentar = df["Kommentar"] if "Kommentar" in df.columns else pd.Series("", index=df.index)
+    df["Kommentar"] = kommentar.where(kommentar != "", teile[1].str.strip())
+
+    if "Typ" in df.columns:  # optional: leer -> Standard-Typ, sonst geprüft wie die anderen Auswahlfelder
+        df["Typ"] = df["Typ"].mask(df["Typ"] == "", eintrag.TYPEN.optionen[0])
+        erlaubt = dict(erlaubt, Typ=eintrag.TYPEN.optionen)
+
+    fehler = pd.Series("", index=df.index)
+    fehler = fehler.mask(df["Regal"] == "", fehler + "Regal fehlt; ")
+    for spalte, werte in erlaubt.items():
+        # Groß-/Kleinschreibung egal, Ausgabe in der Schreibweise der App
+        kanonisch = df[spalte].str.lower().map({w.lower(): w for w in werte})
+        fehler = fehler.mask(kanonisch.isna(), fehler + spalte + " '" + df[spalte] + "' ungültig; ")
+        df[spalte] = kanonisch.fillna(df[spalte])
+
+    ok = fehler == ""
+    schlecht = df.loc[~ok, PFLICHT].assign(Fehler=fehler[~ok].str.rstrip("; "))
+    schlecht.insert(0, "Zeile", schlecht.index + 2)  # +1 Kopfzeile, +1 ab 1 gezählt
+    return df.loc[ok], schlecht
+
+
+def eintraege(df):
+    # Gültige Zeilen -> Einträge (Hauptmangel und Kommentar bleiben getrennt)
+    if "Typ" not in df.columns or (df["Typ"] == "").all():
+        df = df.assign(Typ="Palettenregal")
+    spalten = ["Regal", "Typ", "Bauteil", "Position", "Stufe", "Mangel", "Kommentar", "Massnahme"]
+    return [eintrag.Eintrag(*zeile) for zeile in df[spalten].itertuples(index=False, name=None)]
+
+
+def anzeigen(erlaubt, key="import"):
+    # Upload + Prüfbericht; liefert die gültigen Zeilen, sobald "übernehmen" gedrückt wird
+    nr = st.session_state.setdefault(f"{key}_nr", 0)
+    with st.expander("📥 Massenimport (CSV / Excel)"):
+        st.caption("Spalten: " + ", ".join(PFLICHT) + " (optional Kommentar)")
+        datei = st.file_uploader("Datei", type=["csv", "xlsx", "xls"], key=f"{key}_{nr}")
+        if datei is None:
+            return None
+        try:
+            ok, schlecht = pruefen(lesen(datei), erlaubt)
+        except (ValueError, ImportError) as e:
+            st.error(f"Datei kann nicht gelesen werden: {e}")
+            return None
+        st.write(f"✅ {len(ok)} gültige Zeilen | ❌ {len(schlecht)} fehlerhafte Zeilen")
+        if len(schlecht):
+            st.dataframe(schlecht, hide_index=True, use_container_width=True)
+        if len(ok) and st.button(f"✅ {len(ok)} Zeilen übernehmen", key=f"{key}_ok_{nr}", use_container_width=True):
+            st.session_state[f"{key}_nr"] += 1  # Upload-Feld leeren, damit nichts doppelt importiert wird
+            return ok
+    return None
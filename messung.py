@@ -0,0 +1,136 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import speicher
+
+# --- KONFIGURATION ---
+AN = os.environ.get("REGAL_MESSUNG", "1") != "0"  # 0 = Zeitmessung komplett aus
+PUFFER = int(os.environ.get("REGAL_MESSUNG_PUFFER", "5000"))  # so viele Messpunkte bleiben im RAM
+LOG = os.environ.get("REGAL_MESSUNG_LOG", "")  # JSON-Zeilen-Datei für die Auswertung, leer = kein Log
+PANEL = os.environ.get("REGAL_MESSUNG_PANEL", "") == "1"  # sonst nur mit ?perf=1 in der URL
+BUDGET_MS = int(os.environ.get("REGAL_BUDGET_MS", "300"))  # Ziel: p95 Knopfdruck -> Formular bereit (500 Einträge)
+
+# Ein Ringpuffer pro Server-Prozess; deque.append ist threadsicher, Worker schreiben direkt hinein
+_puffer = deque(maxlen=PUFFER)
+_sitzung = contextvars.ContextVar("sitzung", default=None)
+_log = open(LOG, "a", encoding="utf-8", buffering=1) if AN and LOG else None
+_log_lock = threading.Lock()
+
+
+def _aktuelle_sitzung():
+    # Im Skriptlauf aus der Session, im Worker aus dem mitgegebenen Kontext (siehe im_kontext)
+    sid = _sitzung.get()
+    if sid is None and get_script_run_ctx(suppress_warning=True):
+        sid = st.session_state.get("sitzung")
+    return sid
+
+
+def _merken(name, ms):
+    eintrag = {"zeit": round(time.time(), 3), "name": name, "ms": round(ms, 3),
+               "sitzung": _aktuelle_sitzung(), "thread": threading.current_thread().name}
+    _puffer.append(eintrag)
+    if _log:
+        with _log_lock:
+            _log.write(json.dumps(eintrag) + "\n")
+
+
+class span:
+    # with messung.span("pdf_bauen"): ...  -- zählt auch, wenn der Block mit st.rerun/Exception endet
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if AN:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        if AN:
+            _merken(self.name, (time.perf_counter() - self.t0) * 1000)
+
+
+def gemessen(name):
+    # Als Dekorator; ausgeschaltet wird die Funktion gar nicht erst eingewickelt
+    def deko(fn):
+        if not AN:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deko
+
+
+def im_kontext(fn):
+    # Für pool.submit: der Worker schreibt seine Messpunkte auf die Sitzung, die ihn beauftragt hat
+    ctx = contextvars.copy_context()
+    ctx.run(_sitzung.set, _aktuelle_sitzung())
+    return functools.partial(ctx.run, fn)
+
+
+def skript_start():
+    if AN:
+        st.session_state["_skript_t0"] = time.perf_counter()
+
+
+def skript_ende():
+    # Läufe, die vorher mit st.rerun/st.stop abbrechen, werden nicht gezählt
+    t0 = st.session_state.pop("_skript_t0", None)
+    if t0 is not None:
+        _merken("skript", (time.perf_counter() - t0) * 1000)
+
+
+# --- AUSWERTUNG ---
+def werte(name, sitzung=None):
+    return [e["ms"] for e in list(_puffer) if e["name"] == name and (sitzung is None or e["sitzung"] == sitzung)]
+
+
+def quantil(werte, q):
+    werte = sorted(werte)
+    return werte[int(q * (len(werte) - 1))] if werte else None
+
+
+def p95(name, sitzung=None):
+    return quantil(werte(name, sitzung), 0.95)
+
+
+def uebersicht(sitzung=None):
+    # Je Messpunkt: Anzahl, p50, p95, Max; Hintergrund-Jobs ohne Sitzung (z.B. Kunden-Abgleich) zählen mit
+    gruppen = {}
+    for e in list(_puffer):
+        if sitzung is None or e["sitzung"] in (sitzung, None):
+            gruppen.setdefault(e["name"], []).append(e["ms"])
+    return [{"Messpunkt": name, "n": len(w), "p50 ms": quantil(w, 0.5), "p95 ms": quantil(w, 0.95), "max ms": max(w)}
+            for name, w in sorted(gruppen.items())]
+
+
+def panel(sitzung):
+    if not AN or not (PANEL or st.query_params.get("perf") == "1"):
+        return
+    with st.sidebar.expander("⏱️ Performance"):
+        zeilen = uebersicht(sitzung)
+        if not zeilen:
+            st.caption("Noch keine Messpunkte.")
+            return
+        st.dataframe(zeilen, hide_index=True, use_container_width=True)
+        p = p95("eingabe", sitzung)
+        if p is not None:
+            st.caption(f"{'✅' if p <= BUDGET_MS else '⚠️'} Formular p95 {p:.0f} ms (Budget {BUDGET_MS} ms)")
+        pdfs = speicher.pdf_protokoll(20)
+        if pdfs:
+            st.write("**Zuletzt erzeugte PDFs**")
+            st.dataframe([{"Art": p["art"], "Modus": p["modus"], "Einträge": p["eintraege"],
+                           "MB": round(p["bytes"] / 1e6, 2), "ms": p["ms"]} for p in pdfs],
+                         hide_index=True, use_container_width=True)
+        if LOG:
+            st.caption(f"Log: {LOG}")
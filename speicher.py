@@ -0,0 +1,419 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import eintrag
+
+# --- KONFIGURATION ---
+DB_PFAD = os.environ.get("REGAL_DB", "regal.db")
+AUSSTEHEND = "ausstehend:"  # fotos.pfad eines Bildes, das noch kodiert wird (+ eindeutige Marke je Speichern)
+ARCHIV_SPALTEN = ["bericht_id", "Kunde", "Datum", "Standort", "Bereich",
+                  "Regal", "Typ", "Bauteil", "Position", "Stufe", "Mangel", "Massnahme"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kunden (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS kunden_sheet (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS berichte (
+    id INTEGER PRIMARY KEY,
+    sitzung TEXT,
+    kunde_id INTEGER REFERENCES kunden(id),
+    datum TEXT,
+    standort TEXT,
+    bereich TEXT,
+    abgeschlossen INTEGER NOT NULL DEFAULT 0,
+    stand INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_berichte_kunde ON berichte(kunde_id, abgeschlossen, id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_berichte_entwurf ON berichte(sitzung) WHERE abgeschlossen = 0;
+CREATE TABLE IF NOT EXISTS eintraege (
+    id TEXT PRIMARY KEY,
+    bericht_id INTEGER NOT NULL REFERENCES berichte(id),
+    nr INTEGER NOT NULL,
+    regal TEXT, typ TEXT, bauteil TEXT, position TEXT,
+    stufe TEXT, mangel TEXT, massnahme TEXT,
+    erfasst_von TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_eintraege_bericht ON eintraege(bericht_id, nr);
+CREATE INDEX IF NOT EXISTS ix_eintraege_regal ON eintraege(regal COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS fotos (
+    eintrag_id TEXT NOT NULL REFERENCES eintraege(id) ON DELETE CASCADE,
+    nr INTEGER NOT NULL,
+    pfad TEXT NOT NULL,
+    PRIMARY KEY (eintrag_id, nr)
+);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    zeit REAL NOT NULL,
+    art TEXT NOT NULL,
+    daten TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal_stand (
+    ziel TEXT PRIMARY KEY,
+    bis INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS suche USING fts5(
+    kunde, regal, position, bauteil, mangel, eintrag_id UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2", prefix = '2 3'
+);
+CREATE TABLE IF NOT EXISTS pdf_protokoll (
+    id INTEGER PRIMARY KEY,
+    zeit REAL NOT NULL,
+    art TEXT, modus TEXT,
+    eintraege INTEGER, bytes INTEGER, ms REAL
+);
+"""
+
+# Spalten, die nach der ersten Version dazugekommen sind (für bestehende Datenbanken)
+NACHTRAEGE = [("berichte", "stand", "INTEGER NOT NULL DEFAULT 0"), ("eintraege", "erfasst_von", "TEXT")]
+
+# Eine Verbindung pro Thread (Skriptläufe, Foto- und PDF-Worker)
+_lokal = threading.local()
+# Eine Sperre pro Entwurf: Schreiber desselben Kunden warten im Prozess statt im SQLite-Busy-Timeout
+_sperren = {}
+_sperren_lock = threading.Lock()
+
+
+def _db():
+    con = getattr(_lokal, "con", None)
+    if con is None:
+        con = sqlite3.connect(DB_PFAD, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA foreign_keys=ON")
+        con.executescript(SCHEMA)
+        for tabelle, spalte, typ in NACHTRAEGE:
+            if spalte not in {r["name"] for r in con.execute(f"PRAGMA table_info({tabelle})")}:
+                try:
+                    con.execute(f"ALTER TABLE {tabelle} ADD COLUMN {spalte} {typ}")
+                except sqlite3.OperationalError:
+                    pass  # anderer Thread war schneller
+        _lokal.con = con
+        _suche_nachtragen(con)
+    return con
+
+
+def _sperre(schluessel):
+    with _sperren_lock:
+        return _sperren.setdefault(schluessel, threading.Lock())
+
+
+class _transaktion:
+    # BEGIN IMMEDIATE: sofort Schreibsperre, keine halben Änderungen; mit Schlüssel zusätzlich pro Entwurf serialisiert
+    def __init__(self, schluessel=None):
+        self.sperre = _sperre(schluessel) if schluessel else None
+
+    def __enter__(self):
+        if self.sperre:
+            self.sperre.acquire()
+        try:
+            self.con = _db()
+            self.con.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            if self.sperre:
+                self.sperre.release()
+            raise
+        return self.con
+
+    def __exit__(self, typ, *_):
+        try:
+            self.con.execute("ROLLBACK" if typ else "COMMIT")
+        finally:
+            if self.sperre:
+                self.sperre.release()
+
+
+# --- KUNDEN ---
+def kunden():
+    return [r["name"] for r in _db().execute("SELECT name FROM kunden ORDER BY name")]
+
+
+def kunde_anlegen(name):
+    _db().execute("INSERT OR IGNORE INTO kunden (name) VALUES (?)", (name,))
+
+
+def sheet_kunden():
+    # Letzter bekannter Stand der Google-Sheets-Kundenliste
+    return [r["name"] for r in _db().execute("SELECT name FROM kunden_sheet")]
+
+
+def sheet_kunden_abgleichen(neu, weg):
+    with _transaktion() as con:
+        con.executemany("INSERT OR IGNORE INTO kunden_sheet (name) VALUES (?)", [(n,) for n in neu])
+        con.executemany("DELETE FROM kunden_sheet WHERE name = ?", [(n,) for n in weg])
+
+
+def _kunde_id(con, name):
+    con.execute("INSERT OR IGNORE INTO kunden (name) VALUES (?)", (name,))
+    return con.execute("SELECT id FROM kunden WHERE name = ?", (name,)).fetchone()["id"]
+
+
+# --- JOURNAL (nur anhängen; wird vom Sync-Worker hochgeladen, siehe journal.py) ---
+def _journal(con, art, eintraege):
+    # In derselben Transaktion wie die Änderung selbst -> Journal und Daten passen immer zusammen
+    jetzt = time.time()
+    con.executemany("INSERT INTO journal (zeit, art, daten) VALUES (?, ?, ?)",
+                    [(jetzt, art, json.dumps(d, ensure_ascii=False)) for d in eintraege])
+
+
+def _journal_eintrag(bericht_id, item):
+    return {"bericht": bericht_id, "id": item["_id"], "Regal": item["Regal"], "Typ": item.get("Typ"),
+            "Bauteil": item["Bauteil"], "Position": item["Position"], "Stufe": item["Stufe"], "Mangel": item["Mangel"],
+            "Massnahme": item["Massnahme"], "von": item.get("_von")}
+
+
+def journal_lesen(nach, arten, limit):
+    return [(r["id"], r["zeit"], r["art"], json.loads(r["daten"])) for r in _db().execute(
+        f"SELECT * FROM journal WHERE id > ? AND art IN ({','.join('?' * len(arten))}) ORDER BY id LIMIT ?",
+        (nach, *arten, limit))]
+
+
+def journal_offen(nach, arten):
+    return _db().execute(f"SELECT COUNT(*) FROM journal WHERE id > ? AND art IN ({','.join('?' * len(arten))})",
+                         (nach, *arten)).fetchone()[0]
+
+
+def journal_stand(ziel):
+    row = _db().execute("SELECT bis FROM journal_stand WHERE ziel = ?", (ziel,)).fetchone()
+    return row["bis"] if row else 0
+
+
+def journal_quittieren(ziel, bis):
+    _db().execute("INSERT INTO journal_stand (ziel, bis) VALUES (?, ?) "
+                  "ON CONFLICT(ziel) DO UPDATE SET bis = MAX(bis, excluded.bis)", (ziel, bis))
+
+
+# --- ENTWURF (laufende Inspektion) ---
+# Schlüssel ist die Sitzung (ein Prüfer) oder z.B. "kunde:<Name>" (alle Prüfer eines Kunden teilen sich den Entwurf)
+def _entwurf_id(con, sitzung):
+    row = con.execute("SELECT id FROM berichte WHERE sitzung = ? AND abgeschlossen = 0", (sitzung,)).fetchone()
+    if row:
+        return row["id"]
+    return con.execute("INSERT INTO berichte (sitzung) VALUES (?)", (sitzung,)).lastrowid
+
+
+def _eintraege(con, bericht_id):
+    fotos = {}
+    for r in con.execute("SELECT f.eintrag_id, f.pfad FROM fotos f JOIN eintraege e ON e.id = f.eintrag_id "
+                         "WHERE e.bericht_id = ? ORDER BY f.eintrag_id, f.nr", (bericht_id,)):
+        fotos.setdefault(r["eintrag_id"], []).append(r["pfad"])
+    return [eintrag.Eintrag(r["regal"], r["typ"], r["bauteil"], r["position"], r["stufe"], *eintrag.mangel_teilen(r["mangel"]),
+                            r["massnahme"], fotos.get(r["id"], ()), r["id"], r["erfasst_von"])
+            for r in con.execute("SELECT * FROM eintraege WHERE bericht_id = ? ORDER BY nr", (bericht_id,))]
+
+
+def entwurf_laden(sitzung):
+    row = _db().execute("SELECT id FROM berichte WHERE sitzung = ? AND abgeschlossen = 0", (sitzung,)).fetchone()
+    return _eintraege(_db(), row["id"]) if row else []
+
+
+def entwurf_stand(sitzung):
+    # Ändert sich bei jedem Schreibzugriff auf den Entwurf -> andere Sitzungen wissen, wann sie neu laden müssen
+    row = _db().execute("SELECT id, stand FROM berichte WHERE sitzung = ? AND abgeschlossen = 0", (sitzung,)).fetchone()
+    return (row["id"], row["stand"]) if row else None
+
+
+def _geaendert(con, bericht_id):
+    con.execute("UPDATE berichte SET stand = stand + 1 WHERE id = ?", (bericht_id,))
+
+
+def _foto_nachtragen(eintrag_id, platzhalter, future):
+    # Läuft im Foto-Worker, sobald das Bild kodiert ist. Trifft nur die eigene Platzhalter-Zeile:
+    # wurde der Eintrag inzwischen neu gespeichert (oder gelöscht), ist sie weg und es passiert nichts.
+    with _transaktion() as con:
+        if future.exception() is None:
+            cur = con.execute("UPDATE fotos SET pfad = ? WHERE eintrag_id = ? AND pfad = ?",
+                              (future.result(), eintrag_id, platzhalter))
+        else:
+            cur = con.execute("DELETE FROM fotos WHERE eintrag_id = ? AND pfad = ?", (eintrag_id, platzhalter))
+        if cur.rowcount:
+            con.execute("UPDATE berichte SET stand = stand + 1 WHERE id = "
+                        "(SELECT bericht_id FROM eintraege WHERE id = ?)", (eintrag_id,))
+
+
+def eintrag_speichern(sitzung, item, ans_ende=True):
+    # Legt den Eintrag an oder aktualisiert ihn; ans_ende=False behält die Position in der Liste.
+    # item["_von"] (Sitzung des Prüfers) wird nur beim Anlegen übernommen.
+    item.setdefault("_id", uuid.uuid4().hex)
+    felder = (item["Regal"], item.get("Typ"), item["Bauteil"], item["Position"], item["Stufe"],
+              item["Mangel"], item["Massnahme"], item.get("_von"))
+    with _transaktion(sitzung) as con:
+        bid = _entwurf_id(con, sitzung)
+        nr = con.execute("SELECT COALESCE(MAX(nr), -1) + 1 FROM eintraege WHERE bericht_id = ?", (bid,)).fetchone()[0]
+        einfuegen = ("INSERT INTO eintraege (id, bericht_id, nr, regal, typ, bauteil, position, stufe, mangel, massnahme, "
+                     "erfasst_von) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        # Nur Einträge des eigenen Entwurfs aktualisieren -- abgeschlossene Berichte bleiben unverändert
+        cur = con.execute(
+            einfuegen + " ON CONFLICT(id) DO UPDATE SET "
+            "regal=excluded.regal, typ=excluded.typ, bauteil=excluded.bauteil, position=excluded.position, "
+            "stufe=excluded.stufe, mangel=excluded.mangel, massnahme=excluded.massnahme"
+            + (", nr=excluded.nr" if ans_ende else "") + " WHERE eintraege.bericht_id = excluded.bericht_id",
+            (item["_id"], bid, nr) + felder)
+        if cur.rowcount == 0:
+            # Bericht wurde während der Bearbeitung abgeschlossen: Änderung als neuer Eintrag in den neuen Entwurf
+            item["_id"] = uuid.uuid4().hex
+            con.execute(einfuegen, (item["_id"], bid, nr) + felder)
+        _geaendert(con, bid)
+        _journal(con, "eintrag", [_journal_eintrag(bid, item)])
+        con.execute("DELETE FROM fotos WHERE eintrag_id = ?", (item["_id"],))
+        offen = []
+        for i, f in enumerate(item["Fotos"]):
+            if not isinstance(f, str):
+                # Noch in Arbeit: Platzhalter (kein Dateipfad, wird beim PDF/Aufräumen übergangen)
+                offen.append((f"{AUSSTEHEND}{uuid.uuid4().hex}", f))
+                f = offen[-1][0]
+            con.execute("INSERT INTO fotos (eintrag_id, nr, pfad) VALUES (?, ?, ?)", (item["_id"], i, f))
+    for platzhalter, f in offen:
+        f.add_done_callback(lambda fut, p=platzhalter: _foto_nachtragen(item["_id"], p, fut))
+
+
+def eintraege_speichern(sitzung, items):
+    # Viele neue Einträge (ohne Fotos) in einer Transaktion anhängen, z.B. aus dem Massenimport
+    with _transaktion(sitzung) as con:
+        bid = _entwurf_id(con, sitzung)
+        nr = con.execute("SELECT COALESCE(MAX(nr), -1) + 1 FROM eintraege WHERE bericht_id = ?", (bid,)).fetchone()[0]
+        for item in items:
+            item.setdefault("_id", uuid.uuid4().hex)
+        con.executemany(
+            "INSERT INTO eintraege (id, bericht_id, nr, regal, typ, bauteil, position, stufe, mangel, massnahme, "
+            "erfasst_von) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(item["_id"], bid, nr + i, item["Regal"], item.get("Typ"), item["Bauteil"], item["Position"],
+              item["Stufe"], item["Mangel"], item["Massnahme"], item.get("_von"))
+             for i, item in enumerate(items)])
+        _geaendert(con, bid)
+        _journal(con, "eintrag", [_journal_eintrag(bid, item) for item in items])
+
+
+def foto_pfade():
+    # Alle Fotos, auf die noch ein Eintrag zeigt (Entwürfe und Archiv); alles andere darf weg
+    return {r["pfad"] for r in _db().execute("SELECT DISTINCT pfad FROM fotos")}
+
+
+def eintrag_loeschen(item):
+    if "_id" in item:
+        with _transaktion() as con:
+            con.execute("UPDATE berichte SET stand = stand + 1 WHERE id = "
+                        "(SELECT bericht_id FROM eintraege WHERE id = ?)", (item["_id"],))
+            con.execute("DELETE FROM fotos WHERE eintrag_id = ?", (item["_id"],))
+            con.execute("DELETE FROM eintraege WHERE id = ?", (item["_id"],))
+            _journal(con, "geloescht", [{"id": item["_id"]}])
+
+
+def bericht_abschliessen(sitzung, kunde, datum, standort, bereich):
+    # Der Entwurf wird zum Archivbericht; Einträge und Fotos bleiben, wo sie sind
+    with _transaktion(sitzung) as con:
+        bid = _entwurf_id(con, sitzung)
+        con.execute("UPDATE berichte SET kunde_id = ?, datum = ?, standort = ?, bereich = ?, abgeschlossen = 1, "
+                    "sitzung = NULL WHERE id = ?", (_kunde_id(con, kunde), datum, standort, bereich, bid))
+        anzahl = con.execute("SELECT COUNT(*) FROM eintraege WHERE bericht_id = ?", (bid,)).fetchone()[0]
+        _indexieren(con, "?", (bid,))
+        _journal(con, "bericht", [{"bericht": bid, "Kunde": kunde, "Datum": datum, "Standort": standort,
+                                   "Bereich": bereich, "Eintraege": anzahl}])
+    return bid
+
+
+# --- ARCHIV ---
+def berichte(kunde):
+    # Nur Kopfdaten, neueste zuerst (über ix_berichte_kunde)
+    return [{"id": r["id"], "Kunde": kunde, "Datum": r["datum"], "Standort": r["standort"], "Bereich": r["bereich"]}
+            for r in _db().execute(
+                "SELECT b.* FROM berichte b JOIN kunden k ON k.id = b.kunde_id "
+                "WHERE k.name = ? AND b.abgeschlossen = 1 ORDER BY b.id DESC", (kunde,))]
+
+
+def bericht(bericht_id):
+    con = _db()
+    r = con.execute("SELECT b.*, k.name AS kunde FROM berichte b LEFT JOIN kunden k ON k.id = b.kunde_id "
+                    "WHERE b.id = ?", (bericht_id,)).fetchone()
+    return {"id": r["id"], "Datum": r["datum"], "Kunde": r["kunde"], "Standort": r["standort"], "Bereich": r["bereich"],
+            "Details": _eintraege(con, bericht_id)}
+
+
+# --- SUCHE (FTS5-Index nur über abgeschlossene Berichte, wächst mit bericht_abschliessen) ---
+def _indexieren(con, berichte_sql, params=()):
+    con.execute(f"INSERT INTO suche (kunde, regal, position, bauteil, mangel, eintrag_id) "
+                f"SELECT k.name, e.regal, e.position, e.bauteil, e.mangel, e.id FROM eintraege e "
+                f"JOIN berichte b ON b.id = e.bericht_id LEFT JOIN kunden k ON k.id = b.kunde_id "
+                f"WHERE e.bericht_id IN ({berichte_sql}) ORDER BY e.bericht_id, e.nr", params)
+
+
+def _suche_nachtragen(con):
+    # Bestehende Datenbanken: Archiv einmalig in den (noch leeren) Index übernehmen
+    sql = "SELECT NOT EXISTS (SELECT 1 FROM suche) AND EXISTS (SELECT 1 FROM berichte WHERE abgeschlossen = 1)"
+    if con.execute(sql).fetchone()[0]:
+        with _transaktion() as con:
+            if con.execute(sql).fetchone()[0]:  # anderer Thread war schneller
+                _indexieren(con, "SELECT id FROM berichte WHERE abgeschlossen = 1 ORDER BY id")
+
+
+def _phrase(text):
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def _fts_anfrage(text, kunde=None):
+    # Jedes Wort als Präfix-Phrase: "r-01" findet R-017, "stapler" findet Stapleranprall.
+    # Der Kunde schränkt schon im Index ein (exakt geprüft wird danach per JOIN).
+    woerter = " ".join(_phrase(w) + "*" for w in text.split() if any(c.isalnum() for c in w))
+    if not woerter:
+        return ""
+    anfrage = f"{{regal position bauteil mangel}} : ({woerter})"
+    return f"{anfrage} AND kunde : {_phrase(kunde)}" if kunde else anfrage
+
+
+def suchen(text, kunde=None, limit=200):
+    # Neueste Treffer zuerst (rowid = Reihenfolge des Abschließens), bricht nach limit Treffern ab
+    anfrage = _fts_anfrage(text, kunde)
+    if not anfrage:
+        return []
+    return [dict(r) for r in _db().execute(
+        "SELECT b.id AS bericht_id, k.name AS Kunde, b.datum AS Datum, b.bereich AS Bereich, e.regal AS Regal, "
+        "e.bauteil AS Bauteil, e.position AS Position, e.stufe AS Stufe, e.mangel AS Mangel, e.massnahme AS Massnahme "
+        "FROM suche s JOIN eintraege e ON e.id = s.eintrag_id JOIN berichte b ON b.id = e.bericht_id "
+        "LEFT JOIN kunden k ON k.id = b.kunde_id "
+        f"WHERE suche MATCH ? {'AND k.name = ? ' if kunde else ''}ORDER BY s.rowid DESC LIMIT ?",
+        (anfrage, kunde, limit) if kunde else (anfrage, limit))]
+
+
+def regal_verlauf(kunde, regal):
+    # Alle archivierten Einträge eines Regals, älteste Prüfung zuerst (über ix_eintraege_regal)
+    return [dict(r) for r in _db().execute(
+        "SELECT b.id AS bericht_id, b.datum AS Datum, b.bereich AS Bereich, e.regal AS Regal, e.bauteil AS Bauteil, "
+        "e.position AS Position, e.stufe AS Stufe, e.mangel AS Mangel, e.massnahme AS Massnahme "
+        "FROM eintraege e JOIN berichte b ON b.id = e.bericht_id JOIN kunden k ON k.id = b.kunde_id "
+        "WHERE e.regal = ? COLLATE NOCASE AND b.abgeschlossen = 1 AND k.name = ? ORDER BY b.id, e.nr",
+        (regal.strip(), kunde))]
+
+
+# --- AUSWERTUNG ---
+def archiv_ids():
+    return [r["id"] for r in _db().execute("SELECT id FROM berichte WHERE abgeschlossen = 1")]
+
+
+def archiv_eintraege(ids):
+    # Flache Zeilen (ohne Fotos) in der Reihenfolge von ARCHIV_SPALTEN; blockweise wegen der Parametergrenze
+    con, zeilen = _db(), []
+    for i in range(0, len(ids), 500):
+        block = list(ids[i:i + 500])
+        zeilen += [tuple(r) for r in con.execute(
+            "SELECT b.id, k.name, b.datum, b.standort, b.bereich, "
+            "e.regal, e.typ, e.bauteil, e.position, e.stufe, e.mangel, e.massnahme "
+            "FROM eintraege e JOIN berichte b ON b.id = e.bericht_id LEFT JOIN kunden k ON k.id = b.kunde_id "
+            f"WHERE b.id IN ({','.join('?' * len(block))}) ORDER BY b.id, e.nr", block)]
+    return zeilen
+
+
+# --- PDF-PROTOKOLL (Größe und Bauzeit je erzeugtem Bericht) ---
+def pdf_protokollieren(art, modus, eintraege, groesse, ms):
+    _db().execute("INSERT INTO pdf_protokoll (zeit, art, modus, eintraege, bytes, ms) VALUES (?, ?, ?, ?, ?, ?)",
+                  (time.time(), art, modus, eintraege, groesse, round(ms, 1)))
+
+
+def pdf_protokoll(limit=50):
+    return [dict(r) for r in _db().execute("SELECT * FROM pdf_protokoll ORDER BY id DESC LIMIT ?", (limit,))]